@@ -0,0 +1,104 @@
+import os
+import json
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+import asyncpg
+import db
+from utils import escape_markdown
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "alerts_changed"
+
+class OpenAlert:
+    __slots__ = (
+        "address", "address_md", "message_id", "initial_market_cap", "chat_id",
+        "bot_name", "bot_name_md", "timestamp", "bonded", "last_market_cap", "max_threshold", "max_multiple",
+    )
+
+    def __init__(self, row):
+        self.address: str = row["address"]
+        self.address_md: str = escape_markdown(row["address"])
+        self.message_id: int = row["message_id"]
+        self.initial_market_cap: float = row["initial_market_cap"] or 0.0
+        self.chat_id: int = row["chat_id"]
+        self.bot_name: str = row["bot_name"]
+        self.bot_name_md: str = escape_markdown(row["bot_name"] or "")
+        self.timestamp: datetime = datetime.fromisoformat(row["timestamp"])
+        self.bonded: bool = bool(row["bonded"])
+        self.last_market_cap: float = row.get("last_market_cap") or 0.0
+        self.max_threshold: float = row.get("max_threshold") or 0.0
+        self.max_multiple: float = row.get("max_multiple") or 0.0
+
+    def update(self, row):
+        # Keep the in-memory high-water marks if a notification carries older values
+        self.bonded = self.bonded or bool(row["bonded"])
+        self.last_market_cap = row.get("last_market_cap") or self.last_market_cap
+        self.max_threshold = max(self.max_threshold, row.get("max_threshold") or 0.0)
+        self.max_multiple = max(self.max_multiple, row.get("max_multiple") or 0.0)
+        if row["initial_market_cap"] != self.initial_market_cap:
+            self.initial_market_cap = row["initial_market_cap"] or 0.0
+
+class OpenAlertStore:
+    """Open alerts kept in memory: loaded once, then kept current from the
+    `alerts_changed` notifications emitted by the trigger on `alerts`."""
+
+    def __init__(self):
+        self.alerts: Dict[str, OpenAlert] = {}
+        self.loaded = False
+        self._listener: Optional[asyncpg.Connection] = None
+
+    def __len__(self) -> int:
+        return len(self.alerts)
+
+    def snapshot(self) -> List[OpenAlert]:
+        return list(self.alerts.values())
+
+    def apply(self, op: str, row: dict):
+        address = row["address"]
+        if op == "DELETE" or row.get("closed"):
+            self.alerts.pop(address, None)
+        elif address in self.alerts:
+            self.alerts[address].update(row)
+        else:
+            self.alerts[address] = OpenAlert(row)
+
+    async def load(self, conn):
+        rows = await db.fetch("alerts_open_all", conn=conn)
+        self.alerts = {row["address"]: OpenAlert(dict(row)) for row in rows}
+        self.loaded = True
+        logger.info(f"Loaded {len(self.alerts)} open alerts")
+
+    def _on_notify(self, conn, pid, channel, payload):
+        try:
+            change = json.loads(payload)
+            self.apply(change["op"], change["row"])
+        except Exception as e:
+            logger.error(f"Bad {CHANNEL} payload: {e}")
+
+    async def listen(self):
+        """Hold a dedicated LISTEN connection, reloading after each reconnect
+        so changes made while disconnected are not missed."""
+        while True:
+            try:
+                self._listener = await asyncpg.connect(os.getenv("DATABASE_URL"))
+                await self._listener.add_listener(CHANNEL, self._on_notify)
+                await self.load(self._listener)
+                while not self._listener.is_closed():
+                    await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Alert store listener failed: {e}")
+            finally:
+                await self.close()
+            await asyncio.sleep(5)
+
+    async def close(self):
+        if self._listener and not self._listener.is_closed():
+            await self._listener.close()
+        self._listener = None
+
+alert_store = OpenAlertStore()
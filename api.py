@@ -1,8 +1,14 @@
 import os
 from datetime import datetime, timezone
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request, Response
 from aiolimiter import AsyncLimiter
-from db import get_db_connection
+import db
+from upstream import upstream_stats
+from broadcast import broadcaster
+from entity_cache import sender_cache
+from tracing import tracer
+from uptime import uptime_monitor
+from export import stream_export, export_query
 from utils import calculate_hitrate, format_value, format_percentage, format_time_diff, format_market_cap, format_liquidity, format_volume
 
 app = Flask(__name__)
@@ -15,59 +21,124 @@ async def index():
         "endpoints": [
             {"path": "/alerts", "method": "GET", "description": "Get recent token alerts"},
             {"path": "/stats/<user_id>", "method": "GET", "description": "Get user statistics"},
-            {"path": "/uptime", "method": "GET", "description": "Get uptime status"},
-            {"path": "/health", "method": "GET", "description": "Health check endpoint"}
+            {"path": "/uptime", "method": "GET", "description": "Get availability and latency percentiles per uptime target"},
+            {"path": "/export/<table>", "method": "GET", "description": "Stream alerts or user_calls as CSV/NDJSON (format, since, until, gzip; needs EXPORT_TOKEN)"},
+            {"path": "/traces", "method": "GET", "description": "Slowest recent alert traces and per-step latency breakdown"},
+            {"path": "/stream", "method": "GET", "description": "Server-Sent Events stream of alerts, bonding and threshold events"},
+            {"path": "/health", "method": "GET", "description": "Database, pool, per-query and upstream health"}
         ]
     })
 
 @app.route('/health')
-async def health():
-    return jsonify({"status": "healthy"}), 200
+def health():
+    # The pool belongs to the bot's event loop; report its latest check
+    database = db.last_health()
+    healthy = database["status"] in ("ok", "unknown")  # unknown: no check yet, starting up
+    return jsonify({
+        "status": ("starting" if database["status"] == "unknown" else "healthy") if healthy else "degraded",
+        "database": database,
+        "queries": db.query_stats(),
+        "upstream": upstream_stats(),
+        "sender_cache": sender_cache.stats()
+    }), 200 if healthy else 503
 
-@app.route('/alerts')
-async def get_alerts():
+def on_bot_loop(coro):
+    """Run a DB-backed coroutine on the bot's loop, which owns the pool."""
+    try:
+        return db.run_on_pool_loop(coro), None
+    except Exception as e:
+        return None, (jsonify({"error": f"Database unavailable: {e or type(e).__name__}"}), 503)
+
+async def recent_alerts() -> list:
+    async with rate_limiter:
+        alerts = await db.fetch("alerts_recent")
+        formatted_alerts = []
+        for alert in alerts:
+            formatted_alerts.append({
+                "address": alert["address"],
+                "message_id": alert["message_id"],
+                "initial_market_cap": await format_market_cap(alert["initial_market_cap"]),
+                "chat_id": alert["chat_id"],
+                "bot_name": alert["bot_name"],
+                "timestamp": alert["timestamp"],
+                "bonded": alert["bonded"]
+            })
+        return formatted_alerts
+
+async def rate_limited_hitrate(user_id: int) -> tuple:
     async with rate_limiter:
-        pool = await get_db_connection()
-        async with pool.acquire() as conn:
-            alerts = await conn.fetch("SELECT * FROM alerts WHERE NOT closed ORDER BY timestamp DESC LIMIT 10")
-            formatted_alerts = []
-            for alert in alerts:
-                formatted_alerts.append({
-                    "address": alert["address"],
-                    "message_id": alert["message_id"],
-                    "initial_market_cap": await format_market_cap(alert["initial_market_cap"]),
-                    "chat_id": alert["chat_id"],
-                    "bot_name": alert["bot_name"],
-                    "timestamp": alert["timestamp"],
-                    "bonded": alert["bonded"]
-                })
-            return jsonify(formatted_alerts)
+        return await calculate_hitrate(user_id)
 
-@app.route('/stats/<int:user_id>')
-async def get_stats(user_id):
+@app.route('/alerts')
+def get_alerts():
+    formatted_alerts, error = on_bot_loop(recent_alerts())
+    if error:
+        return error
+    return jsonify(formatted_alerts)
+
+@app.route('/stream')
+def stream_events():
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({"error": "Invalid Last-Event-ID"}), 400
+    return Response(
+        broadcaster.stream(last_event_id),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route('/export/<table>')
+def export_table(table):
+    token = os.getenv("EXPORT_TOKEN")
+    if not token or request.headers.get("Authorization") != f"Bearer {token}":
+        return jsonify({"error": "Unauthorized"}), 401
+    fmt = request.args.get("format", "csv")
+    since, until = request.args.get("since"), request.args.get("until")
+    compress = request.args.get("gzip") in ("1", "true")
+    try:
+        export_query(table, fmt, since, until)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    filename = f"{table}.{'csv' if fmt == 'csv' else 'ndjson'}{'.gz' if compress else ''}"
+    return Response(
+        stream_export(table, fmt, since, until, compress=compress),
+        mimetype="application/gzip" if compress else ("text/csv" if fmt == "csv" else "application/x-ndjson"),
+        headers={"Content-Disposition": f"attachment; filename={filename}", "X-Accel-Buffering": "no"}
+    )
+
+@app.route('/traces')
+async def get_traces():
     async with rate_limiter:
-        hitrate_5x, hitrate_2x, migration_rate, total_calls, successful_5x, total_unbonded, migrated = await calculate_hitrate(user_id)
+        limit = request.args.get("limit", 10, type=int)
+        kind = request.args.get("kind")
         return jsonify({
-            "user_id": user_id,
-            "hitrate_5x": format_percentage(hitrate_5x),
-            "hitrate_2x": format_percentage(hitrate_2x),
-            "migration_rate": format_percentage(migration_rate),
-            "total_calls": total_calls,
-            "successful_5x": successful_5x,
-            "total_unbonded": total_unbonded,
-            "migrated": migrated
+            "slowest": [trace.to_dict() for trace in tracer.slowest(limit, kind)],
+            "breakdown": tracer.breakdown(kind)
         })
 
+@app.route('/stats/<int:user_id>')
+def get_stats(user_id):
+    stats, error = on_bot_loop(rate_limited_hitrate(user_id))
+    if error:
+        return error
+    hitrate_5x, hitrate_2x, migration_rate, total_calls, successful_5x, total_unbonded, migrated = stats
+    return jsonify({
+        "user_id": user_id,
+        "hitrate_5x": format_percentage(hitrate_5x),
+        "hitrate_2x": format_percentage(hitrate_2x),
+        "migration_rate": format_percentage(migration_rate),
+        "total_calls": total_calls,
+        "successful_5x": successful_5x,
+        "total_unbonded": total_unbonded,
+        "migrated": migrated
+    })
+
 @app.route('/uptime')
 async def get_uptime():
     async with rate_limiter:
-        pool = await get_db_connection()
-        async with pool.acquire() as conn:
-            uptime = await conn.fetchrow("SELECT * FROM uptime_config LIMIT 1")
-            if not uptime:
-                return jsonify({"error": "Uptime URL not set"}), 404
-            return jsonify({
-                "url": uptime["url"],
-                "last_ping": uptime["last_ping"],
-                "status": uptime["status"]
-            })
+        summaries = uptime_monitor.summaries()
+        if not summaries:
+            return jsonify({"error": "Uptime URL not set"}), 404
+        return jsonify({"targets": summaries})
@@ -0,0 +1,89 @@
+"""Memory and sweep setup cost of the in-memory open-alert store.
+
+Compares, for --alerts synthetic open alerts, the per-sweep preparation the
+old monitor_market_cap did on fetched rows (ISO timestamp parse and two
+Markdown escapes per row) with taking a snapshot of OpenAlertStore, and
+reports the per-alert memory of the store versus plain row dicts.
+
+    python benchmarks/alert_store.py --alerts 100000
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+from datetime import datetime, timezone, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from alert_store import OpenAlertStore, OpenAlert  # noqa: E402
+from utils import escape_markdown  # noqa: E402
+
+def make_rows(count: int):
+    now = datetime.now(timezone.utc)
+    return [{
+        "address": f"{i:044d}",
+        "message_id": i,
+        "initial_market_cap": 50_000.0 + i,
+        "chat_id": -1000000000000 - (i % 500),
+        "bot_name": f"bot_{i % 3 + 1}",
+        "timestamp": (now - timedelta(seconds=i)).isoformat(),
+        "bonded": i % 7 == 0,
+        "closed": False,
+        "last_market_cap": 0.0,
+        "max_threshold": 0.0,
+    } for i in range(count)]
+
+def measure_memory(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    obj = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, after - before
+
+def old_sweep_setup(rows):
+    for row in rows:
+        escape_markdown(row["address"])
+        escape_markdown(row["bot_name"])
+        datetime.fromisoformat(row["timestamp"])
+        row["initial_market_cap"], row["chat_id"], row["bonded"]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--alerts", type=int, default=100_000)
+    parser.add_argument("--sweeps", type=int, default=5)
+    args = parser.parse_args()
+
+    rows, rows_bytes = measure_memory(lambda: make_rows(args.alerts))
+    store = OpenAlertStore()
+
+    def build():
+        # From rows of its own that are dropped afterwards, so the strings the
+        # store keeps are counted, as after a real load
+        return {row["address"]: OpenAlert(row) for row in make_rows(args.alerts)}
+    _, store_bytes = measure_memory(build)
+
+    started = time.perf_counter()
+    store.alerts = {row["address"]: OpenAlert(row) for row in rows}
+    load_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(args.sweeps):
+        old_sweep_setup(rows)
+    old_s = (time.perf_counter() - started) / args.sweeps
+
+    started = time.perf_counter()
+    for _ in range(args.sweeps):
+        for alert in store.snapshot():
+            alert.address_md, alert.bot_name_md, alert.timestamp
+    new_s = (time.perf_counter() - started) / args.sweeps
+
+    print(f"alerts:                 {args.alerts}")
+    print(f"row dicts:              {rows_bytes / args.alerts:8.0f} B/alert")
+    print(f"OpenAlertStore:         {store_bytes / args.alerts:8.0f} B/alert")
+    print(f"store load (once):      {load_s * 1000:8.1f} ms")
+    print(f"sweep setup, rows:      {old_s * 1000:8.1f} ms/sweep (plus the SELECT)")
+    print(f"sweep setup, store:     {new_s * 1000:8.1f} ms/sweep")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Throughput and memory of the COPY-based exports.
+
+Seeds --rows synthetic user_calls into the Postgres in DATABASE_URL (use a
+disposable database; the table is truncated), then streams them through
+stream_export as CSV and NDJSON, plain and gzip, reporting MB/s and the
+process's peak RSS growth.
+
+    DATABASE_URL=postgresql://localhost/mrxbot_bench python benchmarks/export.py --rows 5000000
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import resource
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import db  # noqa: E402
+from export import stream_export  # noqa: E402
+
+async def seed(rows: int):
+    await db.init_db()
+    pool = await db.get_db_connection()
+    async with pool.acquire() as conn:
+        await conn.execute("TRUNCATE user_calls")
+        await conn.execute(
+            "INSERT INTO user_calls (user_id, address, initial_market_cap, timestamp, bonded, peak_market_cap) "
+            "SELECT i % 5000, md5(i::text) || md5((i * 7)::text), random() * 1e6, "
+            "to_char(now() - i * interval '1 second', 'YYYY-MM-DD\"T\"HH24:MI:SS.US+00:00'), i % 3 = 0, random() * 5e6 "
+            "FROM generate_series(1, $1) AS i",
+            rows
+        )
+    await db.close_db()
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--skip-seed", action="store_true")
+    args = parser.parse_args()
+
+    if not args.skip_seed:
+        started = time.perf_counter()
+        asyncio.run(seed(args.rows))
+        print(f"seeded {args.rows} rows in {time.perf_counter() - started:.1f}s")
+
+    baseline_rss = peak_rss_mb()
+    for fmt in ("csv", "ndjson"):
+        for compress in (False, True):
+            started = time.perf_counter()
+            size = 0
+            for chunk in stream_export("user_calls", fmt, compress=compress):
+                size += len(chunk)
+            elapsed = time.perf_counter() - started
+            label = f"{fmt}{'.gz' if compress else ''}"
+            print(f"{label:10} {size / 1e6:9.1f} MB  {elapsed:6.2f}s  {size / 1e6 / elapsed:7.1f} MB/s  "
+                  f"peak RSS +{peak_rss_mb() - baseline_rss:.1f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""Offline end-to-end load test of monitor_messages and monitor_market_cap.
+
+Drives the real handlers with a scripted synthetic chat stream through a fake
+Telethon client, local stand-ins for DexScreener, GeckoTerminal and Moralis with
+configurable latency and price paths, and the Postgres in DATABASE_URL (use
+a disposable database: alerts and user_calls are truncated). Reports
+messages/s, call-to-alert latency percentiles, sweep duration and DB query
+counts, and writes them to a JSON baseline that later runs can compare to.
+
+    DATABASE_URL=postgresql://localhost/mrxbot_load python benchmarks/loadtest.py \\
+        --messages 5000 --rate 500 --tokens 300 --latency 0.05 --path pump --out baseline.json
+    ... --compare baseline.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import math
+import random
+import asyncio
+import logging
+import argparse
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("MORALIS_API_KEY", "loadtest")
+import db  # noqa: E402
+import upstream  # noqa: E402
+from bot import monitor_messages, sweep_market_caps  # noqa: E402
+from write_buffer import write_buffer  # noqa: E402
+from alert_store import alert_store  # noqa: E402
+from tracing import tracer  # noqa: E402
+from utils import percentile  # noqa: E402
+
+ADDRESS_IN_ALERT = re.compile(r"`([1-9A-HJ-NP-Za-km-z]{32,44})`")
+# Compared with --compare; True means higher is better
+TRACKED = {
+    "messages_per_s": True,
+    "alert_latency_p50_ms": False,
+    "alert_latency_p95_ms": False,
+    "alert_latency_p99_ms": False,
+    "sweep_p50_ms": False,
+    "ingest_queries": False,
+    "sweep_queries": False,
+}
+
+def token_address(i: int) -> str:
+    alphabet = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+    rng = random.Random(i)
+    return "".join(rng.choice(alphabet) for _ in range(44))
+
+class PricePaths:
+    """Market cap of each synthetic token at the current tick (one per sweep)."""
+
+    def __init__(self, path: str, seed: int = 3):
+        self.path = path
+        self.tick = 0
+        self.rng = random.Random(seed)
+        self.walk = {}
+
+    def market_cap(self, address: str) -> float:
+        initial = random.Random(address).uniform(20_000, 500_000)
+        if self.path == "flat":
+            return float(initial)
+        if self.path == "pump":
+            return initial * 1.8 ** self.tick
+        key = (address, self.tick)
+        if key not in self.walk:
+            previous = self.walk.get((address, self.tick - 1), initial)
+            self.walk[key] = previous * math.exp(self.rng.gauss(0.1, 0.5))
+        return self.walk[key]
+
+def stand_ins(prices: PricePaths, latency: float, jitter: float):
+    async def delay():
+        await asyncio.sleep(max(0.0, random.gauss(latency, jitter)))
+
+    async def dexscreener(request):
+        await delay()
+        address = request.match_info["address"]
+        market_cap = prices.market_cap(address)
+        return web.json_response({"pairs": [{
+            "fdv": market_cap,
+            "pairCreatedAt": int(time.time() * 1000),
+            "baseToken": {"symbol": address[:4].upper(), "name": f"Load {address[:6]}"},
+            "liquidity": {"usd": market_cap / 10},
+            "volume": {"h6": market_cap / 3},
+            "txns": {"h5": {"buys": 100, "sells": 80}},
+            "dexId": "pumpfun",
+        }]})
+
+    async def geckoterminal(request):
+        await delay()
+        market_cap = prices.market_cap(request.match_info["address"])
+        return web.json_response({"data": {"attributes": {"fdv_usd": str(market_cap), "symbol": "LOAD"}}})
+
+    async def moralis(request):
+        await delay()
+        market_cap = prices.market_cap(request.match_info["address"])
+        return web.json_response({"bonded": market_cap >= 69_000, "bondingProgress": min(market_cap / 690, 100.0)})
+
+    app = web.Application()
+    app.router.add_get("/latest/dex/tokens/{address}", dexscreener)
+    app.router.add_get("/api/v2/networks/solana/tokens/{address}", geckoterminal)
+    app.router.add_get("/api/v2/solana/token/{address}/status", moralis)
+    return app
+
+class FakeClient:
+    """Stands in for TelegramClient: records when each alert would be posted."""
+
+    def __init__(self):
+        self.sent = {}
+        self.messages = 0
+
+    async def send_message(self, entity, message, parse_mode=None):
+        self.messages += 1
+        match = ADDRESS_IN_ALERT.search(message)
+        if match:
+            self.sent.setdefault(match.group(1), time.perf_counter())
+
+class FakeBot:
+    def __init__(self, name: str):
+        self.name = name
+        self.client = FakeClient()
+
+class FakeSender:
+    def __init__(self, sender_id: int):
+        self.id = sender_id
+        self.first_name = f"Caller{sender_id}"
+        self.last_name = None
+
+class FakeMessage:
+    def __init__(self, message_id: int, text: str):
+        self.id = message_id
+        self.text = text
+
+class FakeEvent:
+    def __init__(self, message_id: int, chat_id: int, sender_id: int, text: str):
+        self.message = FakeMessage(message_id, text)
+        self.chat_id = chat_id
+        self.sender_id = sender_id
+
+    async def get_sender(self):
+        return FakeSender(self.sender_id)
+
+def chat_stream(args):
+    """Mostly chatter, with calls concentrated on a few hot tokens."""
+    rng = random.Random(5)
+    weights = [1 / (rank + 1) for rank in range(args.tokens)]
+    for i in range(args.messages):
+        chat_id = -1000 - rng.randrange(args.chats)
+        sender_id = 1 + rng.randrange(args.senders)
+        if rng.random() < args.call_ratio:
+            token = rng.choices(range(args.tokens), weights=weights)[0]
+            text = f"aping {token_address(token)} now"
+        else:
+            text = "gm " * rng.randrange(1, 8)
+        yield FakeEvent(i + 1, chat_id, sender_id, text)
+
+async def query_count(conn):
+    try:
+        return await conn.fetchval("SELECT coalesce(sum(calls), 0) FROM pg_stat_statements")
+    except Exception:
+        return await conn.fetchval("SELECT xact_commit FROM pg_stat_database WHERE datname = current_database()")
+
+async def serve(app, port):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+async def run(args) -> dict:
+    prices = PricePaths(args.path)
+    runner = await serve(stand_ins(prices, args.latency, args.jitter), args.port)
+    base_url = f"http://127.0.0.1:{args.port}"
+    for provider in upstream.PROVIDERS.values():
+        provider.base_url = base_url
+
+    await db.init_db()
+    pool = await db.get_db_connection()
+    async with pool.acquire() as conn:
+        await conn.execute("TRUNCATE alerts, user_calls")
+    tasks = [asyncio.create_task(write_buffer.run()), asyncio.create_task(alert_store.listen())]
+    while not alert_store.loaded:
+        await asyncio.sleep(0.1)
+
+    bots = [FakeBot("bot_1")]
+    target_chats = {-1000 - i for i in range(args.chats)}
+    received = {}
+    try:
+        async with pool.acquire() as conn:
+            queries_before = await query_count(conn)
+        handlers = []
+        started = time.perf_counter()
+        for event in chat_stream(args):
+            for address in re.findall(r"[1-9A-HJ-NP-Za-km-z]{32,44}", event.message.text):
+                received.setdefault(address, time.perf_counter())
+            handlers.append(asyncio.create_task(monitor_messages(event, bots, set(), target_chats)))
+            if args.rate:
+                await asyncio.sleep(1 / args.rate)
+        await asyncio.gather(*handlers)
+        ingest_s = time.perf_counter() - started
+        await write_buffer.flush()
+        async with pool.acquire() as conn:
+            queries_after_ingest = await query_count(conn)
+
+        # Let the LISTEN deltas land before sweeping
+        deadline = time.monotonic() + 10
+        while len(alert_store) < len(bots[0].client.sent) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+
+        sweeps = []
+        for _ in range(args.sweeps):
+            prices.tick += 1
+            sweep_started = time.perf_counter()
+            await sweep_market_caps(bots)
+            sweeps.append(time.perf_counter() - sweep_started)
+        await write_buffer.flush()
+        async with pool.acquire() as conn:
+            queries_after_sweeps = await query_count(conn)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await alert_store.close()
+        await upstream.close_session()
+        await db.close_db()
+        await runner.cleanup()
+
+    sent = bots[0].client.sent
+    latencies = [(sent[a] - received[a]) * 1000 for a in sent if a in received]
+    return {
+        "config": vars(args) | {"compare": None, "out": None},
+        "messages": args.messages,
+        "messages_per_s": args.messages / ingest_s,
+        "alerts": len(latencies),
+        "alert_latency_p50_ms": percentile(latencies, 0.50),
+        "alert_latency_p95_ms": percentile(latencies, 0.95),
+        "alert_latency_p99_ms": percentile(latencies, 0.99),
+        "open_alerts": len(alert_store),
+        "sweep_p50_ms": percentile(sweeps, 0.50) * 1000 if sweeps else None,
+        "sweep_max_ms": max(sweeps) * 1000 if sweeps else None,
+        "channel_posts": bots[0].client.messages,
+        "ingest_queries": queries_after_ingest - queries_before,
+        "sweep_queries": queries_after_sweeps - queries_after_ingest,
+        "message_steps": tracer.breakdown("message"),
+        "sweep_steps": tracer.breakdown("sweep"),
+    }
+
+def compare(result: dict, baseline: dict, tolerance: float) -> bool:
+    ok = True
+    for key, higher_is_better in TRACKED.items():
+        new, old = result.get(key), baseline.get(key)
+        if new is None or not old:
+            continue
+        change = (new - old) / old
+        regressed = change < -tolerance if higher_is_better else change > tolerance
+        ok &= not regressed
+        print(f"{key:24} {old:12.1f} -> {new:12.1f}  {change:+7.1%}{'  REGRESSION' if regressed else ''}")
+    return ok
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--rate", type=float, default=500, help="messages/s offered, 0 for as fast as possible")
+    parser.add_argument("--chats", type=int, default=30)
+    parser.add_argument("--senders", type=int, default=500)
+    parser.add_argument("--tokens", type=int, default=300)
+    parser.add_argument("--call-ratio", type=float, default=0.1)
+    parser.add_argument("--latency", type=float, default=0.05, help="stand-in API latency, seconds")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--path", choices=["flat", "pump", "random"], default="random")
+    parser.add_argument("--sweeps", type=int, default=3)
+    parser.add_argument("--port", type=int, default=18741)
+    parser.add_argument("--out", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)  # bot.py configures INFO on import
+
+    result = await run(args)
+    print(json.dumps({k: v for k, v in result.items() if k != "config"}, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            if not compare(result, json.load(f), args.tolerance):
+                sys.exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
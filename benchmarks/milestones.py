@@ -0,0 +1,68 @@
+"""Milestone detection over one sweep of --tokens quotes.
+
+Compares MilestoneEngine.detect with the per-alert Python loop over
+MARKET_CAP_THRESHOLDS that monitor_market_cap used, and checks both agree
+on the highest threshold crossed.
+
+    python benchmarks/milestones.py --tokens 100000
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from milestones import MilestoneEngine  # noqa: E402
+
+THRESHOLDS = [1_000_000, 2_000_000, 5_000_000, 10_000_000, 25_000_000, 50_000_000, 100_000_000, 250_000_000, 500_000_000, 1_000_000_000]
+MULTIPLES = [2, 5, 10]
+
+def python_loop(initial, max_threshold, max_multiple, market_cap):
+    thresholds, multiples = [], []
+    for init, hwm, hwm_x, mc in zip(initial, max_threshold, max_multiple, market_cap):
+        hit = 0.0
+        for threshold in THRESHOLDS:
+            if max(init, hwm) < threshold <= mc:
+                hit = threshold
+        hit_x = 0.0
+        ratio = mc / init if init > 0 else 0.0
+        for multiple in MULTIPLES:
+            if hwm_x < multiple <= ratio:
+                hit_x = multiple
+        thresholds.append(hit)
+        multiples.append(hit_x)
+    return thresholds, multiples
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    initial = rng.lognormal(mean=11.5, sigma=1.5, size=args.tokens)
+    market_cap = initial * rng.lognormal(mean=0.3, sigma=1.0, size=args.tokens)
+    max_threshold = np.where(rng.random(args.tokens) < 0.3, 1_000_000.0, 0.0)
+    max_multiple = np.where(rng.random(args.tokens) < 0.3, 2.0, 0.0)
+    engine = MilestoneEngine(THRESHOLDS, MULTIPLES)
+
+    columns = [initial.tolist(), max_threshold.tolist(), max_multiple.tolist(), market_cap.tolist()]
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        expected = python_loop(*columns)
+    loop_s = (time.perf_counter() - started) / args.repeat
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        thresholds, multiples = engine.detect(*columns)
+    engine_s = (time.perf_counter() - started) / args.repeat
+
+    assert thresholds.tolist() == expected[0] and multiples.tolist() == expected[1]
+    print(f"tokens:        {args.tokens}")
+    print(f"fired:         {int((thresholds > 0).sum())} thresholds, {int((multiples > 0).sum())} multiples")
+    print(f"python loop:   {loop_s * 1000:8.1f} ms/sweep")
+    print(f"numpy engine:  {engine_s * 1000:8.1f} ms/sweep (from lists, {loop_s / engine_s:.0f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Entity lookups per 1,000 messages, replaying a synthetic busy-group stream.
+
+The old monitor_messages resolved the sender of every message before
+filtering; the new one filters on event.sender_id and only resolves names
+through SenderCache for messages that carry a contract address.
+
+    python benchmarks/sender_cache.py --messages 100000 --senders 2000
+"""
+import os
+import sys
+import random
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from entity_cache import SenderCache  # noqa: E402
+
+class FakeSender:
+    def __init__(self, sender_id):
+        self.id = sender_id
+        self.first_name = f"user{sender_id}"
+        self.last_name = None
+
+class FakeEvent:
+    lookups = 0
+
+    def __init__(self, sender_id, chat_id, has_address):
+        self.sender_id = sender_id
+        self.chat_id = chat_id
+        self.has_address = has_address
+
+    async def get_sender(self):
+        FakeEvent.lookups += 1
+        return FakeSender(self.sender_id)
+
+def stream(messages, senders, chats, address_ratio):
+    rng = random.Random(11)
+    # Zipf-like: a few regulars write most messages
+    weights = [1 / (rank + 1) for rank in range(senders)]
+    ids = rng.choices(range(1, senders + 1), weights=weights, k=messages)
+    for sender_id in ids:
+        yield FakeEvent(sender_id, -(sender_id % chats) - 1, rng.random() < address_ratio)
+
+async def replay_old(events, target_users, target_chats):
+    for event in events:
+        sender = await event.get_sender()
+        if sender.id not in target_users and event.chat_id not in target_chats:
+            continue
+
+async def replay_new(events, target_users, target_chats, cache):
+    for event in events:
+        if event.sender_id not in target_users and event.chat_id not in target_chats:
+            continue
+        if not event.has_address:
+            continue
+        await cache.display_name(event)
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--senders", type=int, default=2_000)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--target-chats", type=int, default=10)
+    parser.add_argument("--address-ratio", type=float, default=0.05)
+    args = parser.parse_args()
+
+    target_users = set()
+    target_chats = {-(i + 1) for i in range(args.target_chats)}
+    events = list(stream(args.messages, args.senders, args.chats, args.address_ratio))
+    per_k = 1000 / args.messages
+
+    FakeEvent.lookups = 0
+    await replay_old(events, target_users, target_chats)
+    old = FakeEvent.lookups
+
+    FakeEvent.lookups = 0
+    cache = SenderCache(max_size=1_000)
+    await replay_new(events, target_users, target_chats, cache)
+    new = FakeEvent.lookups
+
+    print(f"messages:                {args.messages}")
+    print(f"lookups/1k, before:      {old * per_k:8.1f}")
+    print(f"lookups/1k, after:       {new * per_k:8.1f}")
+    print(f"cache:                   {cache.stats()}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,303 @@
+"""Tail latency and failure handling of the upstream layer against local fakes.
+
+The latency run points DexScreener at a fake server that answers most requests
+quickly, stalls a configurable fraction and fails another fraction; a second
+stand-in plays GeckoTerminal. It reports p50/p95/p99 for hedged and unhedged
+clients and checks the hedged p99 stays under a bound.
+
+The scenarios drive one scripted server through the breaker and fallback
+paths: the breaker opening on 5xx but not on 404, the half-open trial (never
+hedged), releasing a cancelled trial, GeckoTerminal serving quotes while the
+DexScreener breaker is open, and reading bonding state on-chain while Moralis
+is down. Each prints PASS or FAIL; the exit code is 1 if anything failed.
+
+    python benchmarks/upstream_latency.py --requests 500 --slow 0.05
+    python benchmarks/upstream_latency.py --scenario half_open_trial
+"""
+import os
+import sys
+import time
+import base64
+import struct
+import random
+import asyncio
+import logging
+import argparse
+from collections import Counter
+from datetime import datetime, timezone
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import upstream  # noqa: E402
+from upstream import CircuitBreaker, fetch_json  # noqa: E402
+from utils import fetch_market_cap, percentile  # noqa: E402
+
+SCRIPTED = "http://127.0.0.1:18733"
+TOKEN = "So11111111111111111111111111111111111111112"
+
+def fake_dexscreener(fast: float, slow: float, slow_ratio: float, fail_ratio: float):
+    async def handler(request):
+        roll = random.random()
+        if roll < fail_ratio:
+            return web.json_response({"error": "injected"}, status=503)
+        await asyncio.sleep(slow if roll < fail_ratio + slow_ratio else fast)
+        address = request.match_info["address"]
+        return web.json_response({"pairs": [{
+            "fdv": 1_500_000.0,
+            "baseToken": {"symbol": address[:4], "name": address},
+            "dexId": "raydium",
+        }]})
+    app = web.Application()
+    app.router.add_get("/latest/dex/tokens/{address}", handler)
+    return app
+
+def fake_geckoterminal(fast: float):
+    async def handler(request):
+        await asyncio.sleep(fast)
+        return web.json_response({"data": {"attributes": {"fdv_usd": "1500000", "symbol": "FAKE"}}})
+    app = web.Application()
+    app.router.add_get("/api/v2/networks/solana/tokens/{address}", handler)
+    return app
+
+async def serve(app, port):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+async def run(args, hedge: bool):
+    provider = upstream.PROVIDERS["dexscreener"]
+    provider.latencies.clear()
+    provider.breaker.record_success()
+    provider.hedged = 0
+    provider.hedge_after = args.fast * 4
+    if hedge:
+        provider.__dict__.pop("hedge_delay", None)
+    else:
+        provider.hedge_delay = lambda: provider.timeout
+    latencies, fallbacks = [], 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(i):
+        nonlocal fallbacks
+        async with semaphore:
+            started = time.monotonic()
+            _, _, _, stats = await fetch_market_cap(f"Token{i:040d}", datetime.now(timezone.utc))
+            latencies.append(time.monotonic() - started)
+            if stats.get("ticker") == "FAKE":
+                fallbacks += 1
+
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    return {
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "hedged": provider.hedged,
+        "fallbacks": fallbacks,
+        "breaker": provider.breaker.state,
+    }
+
+def scripted_server(hits: Counter, moralis_status: dict):
+    """Fixed answers per path; `hits` counts requests per route."""
+    async def status(request):
+        hits[request.path] += 1
+        return web.json_response({"ok": True}, status=int(request.match_info["code"]))
+
+    async def delayed(request):
+        hits[request.path] += 1
+        await asyncio.sleep(float(request.match_info["seconds"]))
+        return web.json_response({"ok": True})
+
+    async def dexscreener(request):
+        hits["dexscreener"] += 1
+        return web.json_response({"error": "injected"}, status=503)
+
+    async def geckoterminal(request):
+        hits["geckoterminal"] += 1
+        return web.json_response({"data": {"attributes": {"fdv_usd": "1500000", "symbol": "FAKE"}}})
+
+    async def moralis(request):
+        hits["moralis"] += 1
+        return web.json_response({"bonded": True, "bondingProgress": 100}, status=moralis_status["code"])
+
+    async def solana_rpc(request):
+        hits["solana"] += 1
+        # An open pump.fun curve with 40% of its real token reserves left
+        account = b"\0" * 8 + struct.pack("<5Q", 0, 0, int(793_100_000e6 * 0.4), 0, 0) + b"\0"
+        return web.json_response({"jsonrpc": "2.0", "id": 1, "result": {"value": {
+            "data": [base64.b64encode(account).decode(), "base64"],
+        }}})
+
+    app = web.Application()
+    app.router.add_get("/status/{code}", status)
+    app.router.add_get("/delay/{seconds}", delayed)
+    app.router.add_get("/latest/dex/tokens/{address}", dexscreener)
+    app.router.add_get("/api/v2/networks/solana/tokens/{address}", geckoterminal)
+    app.router.add_get("/api/v2/solana/token/{address}/status", moralis)
+    app.router.add_post("/", solana_rpc)
+    return app
+
+def reset_provider(name: str, reset_timeout: float = 0.2):
+    provider = upstream.PROVIDERS[name]
+    provider.base_url = SCRIPTED
+    provider.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=reset_timeout)
+    provider.latencies.clear()
+    provider.hedged = 0
+    provider.__dict__.pop("hedge_delay", None)
+    provider.hedge_after = 0.02
+    return provider
+
+async def open_breaker(name: str, path: str = "/status/503"):
+    provider = upstream.PROVIDERS[name]
+    for _ in range(provider.breaker.failure_threshold):
+        await fetch_json(name, path)
+    return provider.breaker.state
+
+async def scenario_breaker_opens(hits: Counter, moralis_status: dict):
+    provider = reset_provider("moralis")
+    for _ in range(provider.breaker.failure_threshold * 2):
+        answered, data = await fetch_json("moralis", "/status/404")
+    checks = [("404 is an answer, not a failure", answered and data is None and provider.breaker.state == "closed")]
+    checks.append(("opens after the failure threshold", await open_breaker("moralis") == "open"))
+    before = sum(hits.values())
+    answered, _ = await fetch_json("moralis", "/status/200")
+    checks.append(("open breaker short-circuits", not answered and sum(hits.values()) == before))
+    return checks
+
+async def scenario_half_open_trial(hits: Counter, moralis_status: dict):
+    provider = reset_provider("moralis")
+    await open_breaker("moralis")
+    await asyncio.sleep(provider.breaker.reset_timeout)
+    checks = [("half-open after the reset timeout", provider.breaker.state == "half_open")]
+    # The trial outlasts hedge_after several times over and must still not be hedged
+    answered, _ = await fetch_json("moralis", "/delay/0.15")
+    checks.append(("trial succeeds", answered))
+    checks.append(("trial is not hedged", provider.hedged == 0 and hits["/delay/0.15"] == 1))
+    checks.append(("success closes the breaker", provider.breaker.state == "closed"))
+    return checks
+
+async def scenario_cancelled_trial(hits: Counter, moralis_status: dict):
+    provider = reset_provider("moralis")
+    await open_breaker("moralis")
+    await asyncio.sleep(provider.breaker.reset_timeout)
+    trial = asyncio.create_task(fetch_json("moralis", "/delay/5"))
+    await asyncio.sleep(0.1)
+    checks = [("trial in flight", provider.breaker.trial_in_flight)]
+    trial.cancel()
+    try:
+        await trial
+    except asyncio.CancelledError:
+        pass
+    checks.append(("cancelled trial is released", not provider.breaker.trial_in_flight))
+    answered, _ = await fetch_json("moralis", "/status/200")
+    checks.append(("next request runs the trial", answered and provider.breaker.state == "closed"))
+    return checks
+
+async def scenario_failover(hits: Counter, moralis_status: dict):
+    reset_provider("dexscreener", reset_timeout=60)
+    reset_provider("geckoterminal")
+    for _ in range(upstream.PROVIDERS["dexscreener"].breaker.failure_threshold):
+        await fetch_market_cap(TOKEN, datetime.now(timezone.utc))
+    checks = [("DexScreener breaker opens", upstream.PROVIDERS["dexscreener"].breaker.state == "open")]
+    dex_hits = hits["dexscreener"]
+    _, market_cap, _, stats = await fetch_market_cap(TOKEN, datetime.now(timezone.utc))
+    checks.append(("GeckoTerminal serves the quote", market_cap == 1_500_000 and stats.get("ticker") == "FAKE"))
+    checks.append(("DexScreener is not called while open", hits["dexscreener"] == dex_hits))
+    return checks
+
+async def scenario_bonding_moralis_down(hits: Counter, moralis_status: dict):
+    os.environ.setdefault("MORALIS_API_KEY", "benchmark")
+    from bot import fetch_bonding_status  # only this scenario needs the bot's dependencies
+    reset_provider("moralis", reset_timeout=60)
+    reset_provider("solana")
+    moralis_status["code"] = 404
+    checks = [("Moralis 404 is unknown, not on-chain",
+               await fetch_bonding_status(TOKEN) == (None, None) and hits["solana"] == 0)]
+    moralis_status["code"] = 500
+    checks.append(("Moralis 5xx reads the curve", await fetch_bonding_status(TOKEN) == (False, 60.0)))
+    for _ in range(upstream.PROVIDERS["moralis"].breaker.failure_threshold):
+        await fetch_bonding_status(TOKEN)
+    moralis_hits = hits["moralis"]
+    checks.append(("open breaker reads the curve without Moralis",
+                   await fetch_bonding_status(TOKEN) == (False, 60.0) and hits["moralis"] == moralis_hits))
+    return checks
+
+SCENARIOS = {
+    "breaker_opens": scenario_breaker_opens,
+    "half_open_trial": scenario_half_open_trial,
+    "cancelled_trial": scenario_cancelled_trial,
+    "failover": scenario_failover,
+    "bonding_moralis_down": scenario_bonding_moralis_down,
+}
+
+async def run_scenarios(names) -> bool:
+    hits, moralis_status = Counter(), {"code": 200}
+    server = await serve(scripted_server(hits, moralis_status), 18733)
+    saved = {name: (p.base_url, p.breaker, p.hedge_after) for name, p in upstream.PROVIDERS.items()}
+    passed = True
+    try:
+        for name in names:
+            try:
+                checks = await SCENARIOS[name](hits, moralis_status)
+            except Exception as e:
+                checks = [(f"raised {type(e).__name__}: {e}", False)]
+            failed = [label for label, ok in checks if not ok]
+            passed = passed and not failed
+            print(f"{'PASS' if not failed else 'FAIL'} {name}" + (f": {'; '.join(failed)}" if failed else ""))
+    finally:
+        for name, (base_url, breaker, hedge_after) in saved.items():
+            provider = upstream.PROVIDERS[name]
+            provider.base_url, provider.breaker, provider.hedge_after = base_url, breaker, hedge_after
+            provider.latencies.clear()
+            provider.hedged = 0
+        await server.cleanup()
+    return passed
+
+async def run_latency(args) -> bool:
+    dex = await serve(fake_dexscreener(args.fast, args.stall, args.slow, args.fail), 18731)
+    gecko = await serve(fake_geckoterminal(args.fast), 18732)
+    upstream.PROVIDERS["dexscreener"].base_url = "http://127.0.0.1:18731"
+    upstream.PROVIDERS["geckoterminal"].base_url = "http://127.0.0.1:18732"
+    try:
+        for hedge in (False, True):
+            result = await run(args, hedge)
+            label = "hedged  " if hedge else "unhedged"
+            print(f"{label} p50={result['p50_ms']:.1f}ms p95={result['p95_ms']:.1f}ms "
+                  f"p99={result['p99_ms']:.1f}ms hedged={result['hedged']} "
+                  f"fallbacks={result['fallbacks']} breaker={result['breaker']}")
+        if result["p99_ms"] > args.bound:
+            print(f"FAIL latency: hedged p99 {result['p99_ms']:.1f}ms exceeds {args.bound}ms")
+            return False
+        print("PASS latency")
+        return True
+    finally:
+        await dex.cleanup()
+        await gecko.cleanup()
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenario", choices=["all", "latency", *SCENARIOS], default="all")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--fast", type=float, default=0.02)
+    parser.add_argument("--slow", type=float, default=0.05, help="fraction of stalled responses")
+    parser.add_argument("--stall", type=float, default=2.0)
+    parser.add_argument("--fail", type=float, default=0.01, help="fraction of 503 responses")
+    parser.add_argument("--bound", type=float, default=500, help="max hedged p99 in ms")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.CRITICAL)
+
+    passed = True
+    try:
+        if args.scenario in ("all", "latency"):
+            passed = await run_latency(args) and passed
+        if args.scenario != "latency":
+            names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+            passed = await run_scenarios(names) and passed
+    finally:
+        await upstream.close_session()
+    if not passed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+"""Alert/call write throughput with and without the write-behind buffer.
+
+Simulates bursts of the same token being called in many chats and writes
+them either row by row (two INSERTs per call, as monitor_messages used to)
+or through WriteBuffer. Needs a disposable Postgres in DATABASE_URL; DB CPU
+is taken from pg_stat_statements when the extension is installed.
+
+    DATABASE_URL=postgresql://localhost/mrxbot_bench python benchmarks/write_buffer.py --calls 20000
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import db  # noqa: E402
+from write_buffer import WriteBuffer  # noqa: E402
+from queries import QUERIES  # noqa: E402
+
+async def db_time_ms(conn):
+    try:
+        return await conn.fetchval("SELECT coalesce(sum(total_exec_time), 0) FROM pg_stat_statements")
+    except Exception:
+        return None
+
+async def reset(conn):
+    await conn.execute("TRUNCATE alerts, user_calls")
+    try:
+        await conn.execute("SELECT pg_stat_statements_reset()")
+    except Exception:
+        pass
+
+def workload(calls: int, fanout: int):
+    now = datetime.now(timezone.utc).isoformat()
+    for i in range(calls):
+        address = f"Bench{i // fanout:039d}"
+        yield address, i, 1_000_000.0, -(i % fanout), "bot_1", now, False, 10_000 + i
+
+async def unbuffered(pool, rows):
+    async def write(row):
+        address, message_id, mc, chat_id, bot_name, now, bonded, user_id = row
+        async with pool.acquire() as conn:
+            await conn.execute(QUERIES["alert_insert"], address, message_id, mc, chat_id, bot_name, now, bonded)
+            await conn.execute(QUERIES["call_insert"], user_id, address, mc, now, bonded)
+    await asyncio.gather(*(write(row) for row in rows))
+
+async def buffered(buffer, rows):
+    flusher = asyncio.create_task(buffer.run())
+    for address, message_id, mc, chat_id, bot_name, now, bonded, user_id in rows:
+        buffer.add_alert(address, message_id, mc, chat_id, bot_name, now, bonded)
+        buffer.add_call(user_id, address, mc, now, bonded)
+        if buffer.wakeup.is_set():
+            await asyncio.sleep(0)
+    flusher.cancel()
+    await buffer.flush()
+
+async def measure(label, pool, calls, coro):
+    async with pool.acquire() as conn:
+        await reset(conn)
+    started = time.perf_counter()
+    await coro
+    elapsed = time.perf_counter() - started
+    async with pool.acquire() as conn:
+        cpu = await db_time_ms(conn)
+        written = await conn.fetchval("SELECT count(*) FROM user_calls")
+    cpu_str = f"{cpu:.0f}ms" if cpu is not None else "n/a (pg_stat_statements missing)"
+    print(f"{label:10} {calls / elapsed:10.0f} calls/s  {elapsed:6.2f}s  db_exec={cpu_str}  rows={written}")
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--fanout", type=int, default=30, help="chats calling the same token")
+    parser.add_argument("--batch", type=int, default=500)
+    args = parser.parse_args()
+
+    await db.init_db()
+    pool = await db.get_db_connection()
+    try:
+        rows = list(workload(args.calls, args.fanout))
+        await measure("unbuffered", pool, args.calls, unbuffered(pool, rows))
+        await measure("buffered", pool, args.calls, buffered(WriteBuffer(max_batch=args.batch), rows))
+    finally:
+        await db.close_db()
+
+if __name__ == "__main__":
+    asyncio.run(main())
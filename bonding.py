@@ -0,0 +1,77 @@
+import os
+import base64
+import struct
+import hashlib
+from typing import Optional, Tuple
+from upstream import fetch_json
+
+PUMP_FUN_PROGRAM = os.getenv("PUMP_FUN_PROGRAM", "6EF8rrecthR5Dkzon8Nwu78hRvfCKubJ14M5uBEwF6P")
+# Tokens sold off the curve before it completes (6 decimals); progress is the share sold
+INITIAL_REAL_TOKEN_RESERVES = 793_100_000 * 10 ** 6
+
+_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+_P = 2 ** 255 - 19
+_D = -121665 * pow(121666, _P - 2, _P) % _P
+
+def b58decode(text: str) -> bytes:
+    number = 0
+    for char in text:
+        number = number * 58 + _ALPHABET.index(char)
+    body = number.to_bytes((number.bit_length() + 7) // 8, "big")
+    return b"\0" * (len(text) - len(text.lstrip("1"))) + body
+
+def b58encode(data: bytes) -> str:
+    number = int.from_bytes(data, "big")
+    text = ""
+    while number:
+        number, rest = divmod(number, 58)
+        text = _ALPHABET[rest] + text
+    return "1" * (len(data) - len(data.lstrip(b"\0"))) + text
+
+def _on_curve(key: bytes) -> bool:
+    """Whether 32 bytes decompress to an ed25519 point (PDAs must not)."""
+    y = int.from_bytes(key, "little") & ((1 << 255) - 1)
+    y2 = y * y % _P
+    x2 = (y2 - 1) * pow(_D * y2 + 1, _P - 2, _P) % _P
+    return x2 == 0 or pow(x2, (_P - 1) // 2, _P) == 1
+
+def find_program_address(seeds: list, program_id: str) -> str:
+    program = b58decode(program_id)
+    for bump in range(255, -1, -1):
+        key = hashlib.sha256(b"".join(seeds) + bytes([bump]) + program + b"ProgramDerivedAddress").digest()
+        if not _on_curve(key):
+            return b58encode(key)
+    raise ValueError("No viable bump seed")
+
+def bonding_curve_address(mint: str) -> str:
+    return find_program_address([b"bonding-curve", b58decode(mint)], PUMP_FUN_PROGRAM)
+
+def parse_bonding_curve(data: bytes) -> Tuple[bool, float]:
+    """(complete, progress %) from a pump.fun BondingCurve account: an 8-byte
+    discriminator, five u64 reserve/supply fields, then the `complete` flag."""
+    _, _, real_token_reserves, _, _ = struct.unpack_from("<5Q", data, 8)
+    if data[48]:
+        return True, 100.0
+    progress = (1 - real_token_reserves / INITIAL_REAL_TOKEN_RESERVES) * 100
+    return False, round(min(max(progress, 0.0), 100.0), 2)
+
+async def fetch_curve_status(mint: str) -> Optional[Tuple[bool, float]]:
+    """Bonding state read from the token's pump.fun curve account over Solana
+    RPC, or None when it cannot be determined (RPC down, malformed key, or
+    not a pump.fun token)."""
+    try:
+        curve = bonding_curve_address(mint)
+    except ValueError:
+        return None
+    answered, data = await fetch_json("solana", "", body={
+        "jsonrpc": "2.0", "id": 1, "method": "getAccountInfo",
+        "params": [curve, {"encoding": "base64", "commitment": "confirmed"}],
+    })
+    result = data.get("result") if isinstance(data, dict) else None
+    account = result.get("value") if isinstance(result, dict) else None
+    if not answered or not account:
+        return None
+    try:
+        return parse_bonding_curve(base64.b64decode(account["data"][0]))
+    except (KeyError, IndexError, TypeError, ValueError, struct.error):
+        return None
@@ -1,23 +1,36 @@
 import os
 import re
-import aiohttp
+import time
+import asyncio
 import logging
-import html
-from typing import Set, List, Tuple, Optional
+from typing import Dict, Set, List, Tuple, Optional
 from datetime import datetime, timezone
 from aiolimiter import AsyncLimiter
 from telethon import TelegramClient
 from telethon.tl.types import Message
 from telethon.sessions import StringSession
-from db import get_db_connection, close_db
+import db
+from db import close_db
+from upstream import fetch_json
+from bonding import fetch_curve_status
+from broadcast import broadcaster
+from write_buffer import write_buffer
+from alert_store import alert_store
+from entity_cache import sender_cache, plain_sender_id
+from tracing import tracer
+from milestones import MilestoneEngine, MILESTONE_MULTIPLES
 
-from utils import format_value, format_market_cap, format_percentage, format_time_diff, fetch_market_cap, bonding_progress_bar, calculate_hitrate, format_liquidity, format_volume, format_percentage_change
+from utils import escape_markdown, format_value, format_market_cap, format_percentage, format_time_diff, fetch_market_cap, bonding_progress_bar, calculate_hitrate, format_liquidity, format_volume, format_percentage_change
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 rate_limiter = AsyncLimiter(5, 1)  # 5 requests per second
 MARKET_CAP_THRESHOLDS = [1_000_000, 2_000_000, 5_000_000, 10_000_000, 25_000_000, 50_000_000, 100_000_000, 250_000_000, 500_000_000, 1_000_000_000]
+SWEEP_CONCURRENCY = int(os.getenv("SWEEP_CONCURRENCY", 20))
+milestone_engine = MilestoneEngine(MARKET_CAP_THRESHOLDS, MILESTONE_MULTIPLES)
+# Milestone rows not yet written to alerts, kept across sweeps if a write fails
+unsaved_progress: Dict[str, tuple] = {}
 
 class UserBot:
     def __init__(self, name: str, api_id: int, api_hash: str, session_string: str):
@@ -39,166 +52,203 @@ class UserBot:
         await self.client.disconnect()
         logger.info(f"Bot {self.name} stopped")
 
-def escape_markdown(text: str) -> str:
-    """Escape Markdown special characters."""
-    return str(html.escape(text)).replace("_", "\\_").replace("*", "\\*").replace("`", "\\`")
-
-async def fetch_bonding_status(address: str) -> Tuple[bool, float]:
+async def fetch_bonding_status(address: str) -> Tuple[Optional[bool], Optional[float]]:
+    """(bonded, progress %) from Moralis, or from the token's pump.fun curve
+    account on-chain when Moralis is down or not configured. (None, None)
+    when neither can tell; callers keep what they already know."""
     moralis_api_key = os.getenv("MORALIS_API_KEY")
-    if not moralis_api_key:
-        return False, 0.0
-    headers = {"X-API-Key": moralis_api_key}
-    async with aiohttp.ClientSession() as session:
-        url = f"https://deep-index.moralis.io/api/v2/solana/token/{address}/status"
-        async with session.get(url, headers=headers) as response:
-            if response.status != 200:
-                return False, 0.0
-            data = await response.json()
-            bonded = data.get("bonded", False)
-            progress = data.get("bondingProgress", 0.0)
-            return bonded, progress
+    if moralis_api_key:
+        headers = {"X-API-Key": moralis_api_key}
+        answered, data = await fetch_json("moralis", f"/api/v2/solana/token/{address}/status", headers=headers)
+        if answered:
+            if not isinstance(data, dict):
+                return None, None  # e.g. 404: Moralis does not know the token
+            return bool(data.get("bonded", False)), float(data.get("bondingProgress") or 0.0)
+    status = await fetch_curve_status(address)
+    return status if status is not None else (None, None)
+
+async def post_sweep_alert(bots: List[UserBot], alert, market_cap: float, token_stats: dict, is_bonded: bool, progress: float, caller_label: str, trace, headline: str = ""):
+    address = alert.address_md
+    bot_name = alert.bot_name_md
+    for bot in bots:
+        if bot.name == alert.bot_name:
+            # Fetch caller stats (using chat_id as a proxy for sender if needed)
+            with trace.span("hitrate"):
+                hitrate_5x, hitrate_2x, migration_rate, total_calls, _, total_unbonded, migrated = await calculate_hitrate(alert.chat_id)
+            # Construct the alert message
+            alert_message = (
+                f"{headline}"
+                f"💊*${token_stats.get('ticker', 'UNKNOWN')} | {token_stats.get('name', 'Unknown Token')}*\n"
+                f"├ `{address}`\n\n"
+                f"🤙*{caller_label}{bot_name}*\n"
+                f"├ Hit rate: 5x: {hitrate_5x:.0f}%  | 2x: {hitrate_2x:.0f}%\n"
+                f"└ Migration rate: {migration_rate:.0f}% ({migrated} out of {total_unbonded})\n\n"
+                f"📊 *Token Stats*\n"
+                f"├ MC: ${await format_market_cap(market_cap)} | {format_percentage_change(market_cap, token_stats.get('market_cap_6h_ago', market_cap))} 𝝙\n"
+                f"├ LP: ${format_liquidity(token_stats.get('liquidity', 0.0))}\n"
+                f"├ VOL: ${format_volume(token_stats.get('volume_6h', 0.0))}\n"
+                f"├ Buys: {token_stats.get('buys_5h', 0)} | Sells: {token_stats.get('sells_5h', 0)}\n"
+                f"└ DEX: {token_stats.get('dex', 'Unknown DEX')}\n\n"
+            )
+            if not is_bonded and progress is not None:
+                alert_message += (
+                    f"🏦 *Bond Stats:*\n"
+                    f"└ {bonding_progress_bar(progress)}\n\n"
+                )
+            alert_message += f"💬 *Check Comments For More Details - @FcallD*"
+            with trace.span("send_message"):
+                await bot.client.send_message(os.getenv("ALERT_CHANNEL", "@FcallD"), alert_message, parse_mode="Markdown")
+
+async def quote_alert(alert, semaphore: asyncio.Semaphore):
+    async with semaphore:
+        trace = tracer.start("sweep", alert.address)
+        try:
+            with trace.span("dexscreener"):
+                _, market_cap, _, token_stats = await fetch_market_cap(alert.address, alert.timestamp)
+            if market_cap == 0.0:
+                tracer.finish(trace, "no_quote")
+                return None
+            with trace.span("moralis"):
+                is_bonded, progress = await fetch_bonding_status(alert.address)
+        except Exception as e:
+            logger.error(f"Failed to quote {alert.address}: {e}")
+            tracer.finish(trace, "error")
+            return None
+        if is_bonded is None:
+            is_bonded = alert.bonded
+        trace.pause()  # waiting for the rest of the sweep is not this alert's latency
+        return alert, market_cap, token_stats, is_bonded, progress, trace
+
+async def sweep_market_caps(bots: List[UserBot]):
+    """Re-quote every open alert from the in-memory store, then run milestone
+    detection over the whole sweep at once and post bonding and milestone
+    alerts. Only alerts that reached a new milestone are written back;
+    last_market_cap is otherwise kept in memory. A failure on one alert is
+    logged and does not stop the others or the write-back."""
+    semaphore = asyncio.Semaphore(SWEEP_CONCURRENCY)
+    quotes = [q for q in await asyncio.gather(*(quote_alert(alert, semaphore) for alert in alert_store.snapshot())) if q]
+    if not quotes:
+        return
+    thresholds, multiples = milestone_engine.detect(
+        [q[0].initial_market_cap for q in quotes],
+        [q[0].max_threshold for q in quotes],
+        [q[0].max_multiple for q in quotes],
+        [q[1] for q in quotes],
+    )
+    try:
+        for (alert, market_cap, token_stats, is_bonded, progress, trace), threshold, multiple in zip(quotes, thresholds.tolist(), multiples.tolist()):
+            trace.resume()
+            try:
+                alert.last_market_cap = market_cap
+                posted = False
+                if is_bonded and not alert.bonded:
+                    alert.bonded = True
+                    write_buffer.mark_bonded(alert.address)
+                    broadcaster.publish("bonded", {"address": alert.address, "market_cap": market_cap, "bot_name": alert.bot_name})
+                    await post_sweep_alert(bots, alert, market_cap, token_stats, is_bonded, progress, "Caller Stats: ", trace)
+                    posted = True
+                if threshold or multiple:
+                    alert.max_threshold = max(alert.max_threshold, threshold)
+                    alert.max_multiple = max(alert.max_multiple, multiple)
+                    unsaved_progress[alert.address] = (market_cap, alert.max_threshold, alert.max_multiple, alert.address)
+                    broadcaster.publish("threshold", {
+                        "address": alert.address, "threshold": threshold or None, "multiple": multiple or None,
+                        "market_cap": market_cap, "initial_market_cap": alert.initial_market_cap
+                    })
+                    reached = [f"${await format_market_cap(threshold)}" if threshold else "", f"{multiple:g}x" if multiple else ""]
+                    headline = f"🚀 *Hit {' | '.join(r for r in reached if r)}*\n"
+                    await post_sweep_alert(bots, alert, market_cap, token_stats, is_bonded, progress, "Caller Stats - ", trace, headline)
+                    posted = True
+                tracer.finish(trace, "posted" if posted else "quiet")
+            except Exception as e:
+                logger.error(f"Sweep failed for {alert.address}: {e}")
+                tracer.finish(trace, "error")
+    finally:
+        if unsaved_progress:
+            try:
+                await db.executemany("alert_progress", list(unsaved_progress.values()))
+                unsaved_progress.clear()
+            except Exception as e:
+                logger.error(f"Failed to store milestones for {len(unsaved_progress)} alerts, retrying next sweep: {e}")
 
 async def monitor_market_cap(bots: List[UserBot]):
+    while not alert_store.loaded:
+        await asyncio.sleep(1)
     while True:
-        pool = await get_db_connection()
-        async with pool.acquire() as conn:
-            alerts = await conn.fetch("SELECT * FROM alerts WHERE NOT closed")
-            for alert in alerts:
-                address = escape_markdown(alert["address"])
-                initial_mc = alert["initial_market_cap"]
-                chat_id = alert["chat_id"]
-                message_id = alert["message_id"]
-                bot_name = escape_markdown(alert["bot_name"])
-                timestamp = datetime.fromisoformat(alert["timestamp"])
-                bonded = alert["bonded"]
-                mc_str, market_cap, _, token_stats = await fetch_market_cap(address, timestamp)
-                if market_cap == 0.0:
-                    continue
-                is_bonded, progress = await fetch_bonding_status(address)
-                if is_bonded and not bonded:
-                    bonded = True
-                    await conn.execute(
-                        "UPDATE alerts SET bonded = $1 WHERE address = $2", True, address
-                    )
-                    for bot in bots:
-                        if bot.name == bot_name:
-                            # Fetch caller stats (using chat_id as a proxy for sender if needed)
-                            hitrate_5x, hitrate_2x, migration_rate, total_calls, _, total_unbonded, migrated = await calculate_hitrate(chat_id)
-                            # Construct the alert message
-                            alert_message = (
-                                f"💊*${token_stats.get('ticker', 'UNKNOWN')} | {token_stats.get('name', 'Unknown Token')}*\n"
-                                f"├ `{address}`\n\n"
-                                f"🤙*Caller Stats: {bot_name}*\n"
-                                f"├ Hit rate: 5x: {hitrate_5x:.0f}%  | 2x: {hitrate_2x:.0f}%\n"
-                                f"└ Migration rate: {migration_rate:.0f}% ({migrated} out of {total_unbonded})\n\n"
-                                f"📊 *Token Stats*\n"
-                                f"├ MC: ${await format_market_cap(market_cap)} | {format_percentage_change(market_cap, token_stats.get('market_cap_6h_ago', market_cap))} 𝝙\n"
-                                f"├ LP: ${format_liquidity(token_stats.get('liquidity', 0.0))}\n"
-                                f"├ VOL: ${format_volume(token_stats.get('volume_6h', 0.0))}\n"
-                                f"├ Buys: {token_stats.get('buys_5h', 0)} | Sells: {token_stats.get('sells_5h', 0)}\n"
-                                f"└ DEX: {token_stats.get('dex', 'Unknown DEX')}\n\n"
-                            )
-                            if not is_bonded:
-                                alert_message += (
-                                    f"🏦 *Bond Stats:*\n"
-                                    f"└ {await bonding_progress_bar(progress)}\n\n"
-                                )
-                            alert_message += f"💬 *Check Comments For More Details - @FcallD*"
-                            await bot.client.send_message(os.getenv("ALERT_CHANNEL", "@FcallD"), alert_message, parse_mode="Markdown")
-                for threshold in MARKET_CAP_THRESHOLDS:
-                    if initial_mc < threshold <= market_cap:
-                        for bot in bots:
-                            if bot.name == bot_name:
-                                # Fetch caller stats
-                                hitrate_5x, hitrate_2x, migration_rate, total_calls, _, total_unbonded, migrated = await calculate_hitrate(chat_id)
-                                # Construct the alert message
-                                alert_message = (
-                                    f"💊*${token_stats.get('ticker', 'UNKNOWN')} | {token_stats.get('name', 'Unknown Token')}*\n"
-                                    f"├ `{address}`\n\n"
-                                    f"🤙*Caller Stats - {bot_name}*\n"
-                                    f"├ Hit rate: 5x: {hitrate_5x:.0f}%  | 2x: {hitrate_2x:.0f}%\n"
-                                    f"└ Migration rate: {migration_rate:.0f}% ({migrated} out of {total_unbonded})\n\n"
-                                    f"📊 *Token Stats*\n"
-                                    f"├ MC: ${await format_market_cap(market_cap)} | {format_percentage_change(market_cap, token_stats.get('market_cap_6h_ago', market_cap))} 𝝙\n"
-                                    f"├ LP: ${format_liquidity(token_stats.get('liquidity', 0.0))}\n"
-                                    f"├ VOL: ${format_volume(token_stats.get('volume_6h', 0.0))}\n"
-                                    f"├ Buys: {token_stats.get('buys_5h', 0)} | Sells: {token_stats.get('sells_5h', 0)}\n"
-                                    f"└ DEX: {token_stats.get('dex', 'Unknown DEX')}\n\n"
-                                )
-                                if not is_bonded:
-                                    alert_message += (
-                                        f"🏦 *Bond Stats:*\n"
-                                        f"└ {await bonding_progress_bar(progress)}\n\n"
-                                    )
-                                alert_message += f"💬 *Check Comments For More Details - @FcallD*"
-                                await bot.client.send_message(os.getenv("ALERT_CHANNEL", "@FcallD"), alert_message, parse_mode="Markdown")
+        try:
+            await sweep_market_caps(bots)
+        except Exception as e:
+            logger.error(f"Market cap sweep failed: {e}")
         await asyncio.sleep(300)
 
 async def monitor_messages(event: Message, bots: List[UserBot], target_users: Set[int], target_chats: Set[int]):
+    received = time.perf_counter()
     message = event.message
     if not message.text:
         return
-    sender = await event.get_sender()
-    if not sender:
-        return
     chat_id = event.chat_id
-    sender_id = sender.id
+    sender_id = plain_sender_id(event)
+    if sender_id is None:
+        return
     if sender_id not in target_users and chat_id not in target_chats:
         return
     solana_address_pattern = r"[1-9A-HJ-NP-Za-km-z]{32,44}"
     addresses = re.findall(solana_address_pattern, message.text)
     if not addresses:
         return
-    pool = await get_db_connection()
     for address in addresses:
-        async with pool.acquire() as conn:
-            existing = await conn.fetchrow("SELECT * FROM alerts WHERE address = $1 AND NOT closed", address)
-            if existing:
-                continue
+        if write_buffer.has_alert(address) or address in alert_store.alerts:
+            continue
+        trace = tracer.start("message", address, received)
+        with trace.span("exists_check"):
+            existing = await db.fetchrow("alert_open", address)
+        if existing:
+            tracer.finish(trace, "duplicate")
+            continue
+        with trace.span("dexscreener"):
             mc_str, market_cap, _, token_stats = await fetch_market_cap(address, datetime.now(timezone.utc))
-            if market_cap == 0.0:
-                continue
+        if market_cap == 0.0:
+            tracer.finish(trace, "no_quote")
+            continue
+        with trace.span("moralis"):
             is_bonded, progress = await fetch_bonding_status(address)
-            # Use sender's name or channel caller
-            sender_name = f"{sender.first_name or ''} {sender.last_name or ''}".strip()
-            if not sender_name and chat_id in channel_callers:
-                sender_name = channel_callers[chat_id]
-            if not sender_name:
-                sender_name = "Unknown Caller"
-            sender_name = escape_markdown(sender_name)
-            bot_name = escape_markdown(next((bot.name for bot in bots if bot.name in message.text.lower()), bots[0].name if bots else "unknown"))
-            await conn.execute(
-                "INSERT INTO alerts (address, message_id, initial_market_cap, chat_id, bot_name, timestamp, bonded) "
-                "VALUES ($1, $2, $3, $4, $5, $6, $7) ON CONFLICT (address) DO NOTHING",
-                address, message.id, market_cap, chat_id, bot_name, datetime.now(timezone.utc).isoformat(), is_bonded
-            )
-            await conn.execute(
-                "INSERT INTO user_calls (user_id, address, initial_market_cap, timestamp, bonded) "
-                "VALUES ($1, $2, $3, $4, $5) ON CONFLICT (user_id, address) DO NOTHING",
-                sender_id, address, market_cap, datetime.now(timezone.utc).isoformat(), is_bonded
-            )
-            for bot in bots:
-                if bot.name == bot_name:
-                    # Fetch caller stats
+        # Use sender's name or channel caller
+        with trace.span("resolve_sender"):
+            sender_name = escape_markdown(await sender_cache.display_name(event))
+        bot_name = next((bot.name for bot in bots if bot.name in message.text.lower()), bots[0].name if bots else "unknown")
+        now = datetime.now(timezone.utc).isoformat()
+        with trace.span("insert"):
+            write_buffer.add_alert(address, message.id, market_cap, chat_id, bot_name, now, bool(is_bonded))
+            write_buffer.add_call(sender_id, address, market_cap, now, bool(is_bonded))
+        broadcaster.publish("alert", {
+            "address": address, "chat_id": chat_id, "caller_id": sender_id, "caller": sender_name,
+            "bot_name": bot_name, "market_cap": market_cap, "bonded": is_bonded, "ticker": token_stats.get("ticker")
+        })
+        for bot in bots:
+            if bot.name == bot_name:
+                # Fetch caller stats
+                with trace.span("hitrate"):
                     hitrate_5x, hitrate_2x, migration_rate, total_calls, _, total_unbonded, migrated = await calculate_hitrate(sender_id)
-                    # Construct the alert message
-                    alert_message = (
-                        f"💊*${token_stats.get('ticker', 'UNKNOWN')} | {token_stats.get('name', 'Unknown Token')}*\n"
-                        f"├ `{address}`\n\n"
-                        f"🤙Caller Stats: *{sender_name}*\n"
-                        f"├ Hit rate: *5x: {hitrate_5x:.0f}%  | 2x: {hitrate_2x:.0f}%*\n"
-                        f"└ Migration rate: *{migration_rate:.0f}%* ({migrated} out of {total_unbonded})\n\n"
-                        f"📊 *Token Stats*\n"
-                        f"├ `MC:` *${await format_market_cap(market_cap)}* | *{format_percentage_change(market_cap, token_stats.get('market_cap_6h_ago', market_cap))}* 𝝙\n"
-                        f"├ `LP:` *${format_liquidity(token_stats.get('liquidity', 0.0))}*\n"
-                        f"├ `VOL:` *${format_volume(token_stats.get('volume_6h', 0.0))}*\n"
-                        f"├ `Buys:` *{token_stats.get('buys_5h', 0)}* | *Sells: {token_stats.get('sells_5h', 0)}*\n"
-                        f"└ `DEX:` *{token_stats.get('dex', 'Unknown DEX')}*\n\n"
+                # Construct the alert message
+                alert_message = (
+                    f"💊*${token_stats.get('ticker', 'UNKNOWN')} | {token_stats.get('name', 'Unknown Token')}*\n"
+                    f"├ `{address}`\n\n"
+                    f"🤙Caller Stats: *{sender_name}*\n"
+                    f"├ Hit rate: *5x: {hitrate_5x:.0f}%  | 2x: {hitrate_2x:.0f}%*\n"
+                    f"└ Migration rate: *{migration_rate:.0f}%* ({migrated} out of {total_unbonded})\n\n"
+                    f"📊 *Token Stats*\n"
+                    f"├ `MC:` *${await format_market_cap(market_cap)}* | *{format_percentage_change(market_cap, token_stats.get('market_cap_6h_ago', market_cap))}* 𝝙\n"
+                    f"├ `LP:` *${format_liquidity(token_stats.get('liquidity', 0.0))}*\n"
+                    f"├ `VOL:` *${format_volume(token_stats.get('volume_6h', 0.0))}*\n"
+                    f"├ `Buys:` *{token_stats.get('buys_5h', 0)}* | *Sells: {token_stats.get('sells_5h', 0)}*\n"
+                    f"└ `DEX:` *{token_stats.get('dex', 'Unknown DEX')}*\n\n"
+                )
+                if not is_bonded and progress is not None:
+                    alert_message += (
+                        f"🏦 *Bond Stats:*\n"
+                        f"└ {bonding_progress_bar(progress)}\n\n"
                     )
-                    if not is_bonded:
-                        alert_message += (
-                            f"🏦 *Bond Stats:*\n"
-                            f"└ {await bonding_progress_bar(progress)}\n\n"
-                        )
-                    alert_message += f"💬 *Check Comments For More Details - @FcallD*"
+                alert_message += f"💬 *Check Comments For More Details - @FcallD*"
+                with trace.span("send_message"):
                     await bot.client.send_message(os.getenv("ALERT_CHANNEL", "@FcallD"), alert_message, parse_mode="Markdown")
+        tracer.finish(trace)
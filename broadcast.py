@@ -0,0 +1,57 @@
+import os
+import json
+import threading
+from collections import deque
+from typing import Optional, Iterator, Tuple, List
+
+class Broadcaster:
+    """In-process fan-out of bot events to stream subscribers.
+
+    Events go into one bounded, id-ordered log rather than per-subscriber
+    queues, so publishing is O(1) no matter how many clients are connected.
+    Each subscriber keeps only a cursor; one that falls further behind than
+    the log holds skips ahead to the oldest retained event and is told how
+    many it missed, which keeps slow clients from holding memory."""
+
+    def __init__(self, size: int = 1000):
+        self.events: deque = deque(maxlen=size)
+        self.last_id = 0
+        self.condition = threading.Condition()
+
+    def publish(self, kind: str, data: dict) -> int:
+        with self.condition:
+            self.last_id += 1
+            self.events.append((self.last_id, kind, json.dumps(data, default=str)))
+            self.condition.notify_all()
+            return self.last_id
+
+    def since(self, last_id: int) -> Tuple[int, List[tuple]]:
+        """Events after `last_id` and how many were lost to log truncation."""
+        with self.condition:
+            if not self.events or last_id >= self.last_id:
+                return 0, []
+            oldest = self.events[0][0]
+            missed = max(oldest - last_id - 1, 0)
+            start = max(last_id + 1 - oldest, 0)
+            return missed, [self.events[i] for i in range(start, len(self.events))]
+
+    def wait(self, last_id: int, timeout: float) -> bool:
+        with self.condition:
+            return self.condition.wait_for(lambda: self.last_id > last_id, timeout=timeout)
+
+    def stream(self, last_id: Optional[int] = None, heartbeat: float = 15.0) -> Iterator[str]:
+        """Yield Server-Sent Events frames, resuming after `last_id` if given."""
+        cursor = self.last_id if last_id is None else min(last_id, self.last_id)
+        yield "retry: 3000\n\n"
+        while True:
+            if not self.wait(cursor, heartbeat):
+                yield ": keepalive\n\n"
+                continue
+            missed, events = self.since(cursor)
+            if missed:
+                yield f"event: gap\ndata: {json.dumps({'missed': missed})}\n\n"
+            for event_id, kind, payload in events:
+                yield f"id: {event_id}\nevent: {kind}\ndata: {payload}\n\n"
+                cursor = event_id
+
+broadcaster = Broadcaster(int(os.getenv("STREAM_BUFFER_SIZE", 1000)))
@@ -1,58 +1,235 @@
 import os
+import time
+import asyncio
+import logging
 import asyncpg
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from queries import QUERIES, PREPARED
+
+logger = logging.getLogger(__name__)
+
+POOL_MIN = int(os.getenv("DB_POOL_MIN", 1))
+POOL_MAX = int(os.getenv("DB_POOL_MAX", 10))
+MAX_QUERIES = int(os.getenv("DB_MAX_QUERIES", 50_000))  # recycle a connection after this many queries
+MAX_INACTIVE_LIFETIME = float(os.getenv("DB_MAX_INACTIVE_LIFETIME", 300))  # close idle connections above min after this
+TUNE_INTERVAL = float(os.getenv("DB_TUNE_INTERVAL", 10))
+HEALTH_INTERVAL = float(os.getenv("DB_HEALTH_INTERVAL", 15))
 
 _pool: Optional[asyncpg.Pool] = None
+_limiter: Optional["PoolLimiter"] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None  # the loop that owns the pool
+_last_health: dict = {"status": "unknown"}
+
+class QueryStats:
+    __slots__ = ("calls", "errors", "acquires", "wait_ms", "max_wait_ms", "query_ms", "max_query_ms")
+
+    def __init__(self):
+        self.calls = self.errors = self.acquires = 0
+        self.wait_ms = self.max_wait_ms = self.query_ms = self.max_query_ms = 0.0
+
+    def waited(self, ms: float):
+        self.acquires += 1
+        self.wait_ms += ms
+        self.max_wait_ms = max(self.max_wait_ms, ms)
+
+    def ran(self, ms: float, failed: bool):
+        self.calls += 1
+        self.errors += failed
+        self.query_ms += ms
+        self.max_query_ms = max(self.max_query_ms, ms)
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_wait_ms": round(self.wait_ms / self.acquires, 2) if self.acquires else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 2),
+            "avg_query_ms": round(self.query_ms / self.calls, 2) if self.calls else 0.0,
+            "max_query_ms": round(self.max_query_ms, 2),
+            "total_query_ms": round(self.query_ms, 1),
+        }
+
+_stats: Dict[str, QueryStats] = {}
+
+class PoolLimiter:
+    """Effective cap on checked-out connections, moved between POOL_MIN and
+    POOL_MAX by `tune_pool`. asyncpg cannot resize a pool, so the pool is
+    created at POOL_MAX and this gate decides how many of those connections
+    are used; idle ones above the cap expire after MAX_INACTIVE_LIFETIME."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self.waiting = 0
+        self.condition = asyncio.Condition()
+        self.reset_window()
+
+    def reset_window(self):
+        self.window_acquires = 0
+        self.window_waits = 0
+        self.window_peak = self.in_use
+
+    async def acquire(self):
+        async with self.condition:
+            self.window_acquires += 1
+            if self.in_use >= self.limit:
+                self.window_waits += 1
+                self.waiting += 1
+                try:
+                    await self.condition.wait_for(lambda: self.in_use < self.limit)
+                finally:
+                    self.waiting -= 1
+            self.in_use += 1
+            self.window_peak = max(self.window_peak, self.in_use)
+
+    async def release(self):
+        async with self.condition:
+            self.in_use -= 1
+            self.condition.notify()
+
+    async def resize(self, limit: int):
+        async with self.condition:
+            self.limit = limit
+            self.condition.notify_all()
+
+async def _prepare(conn):
+    # conn.prepare() bypasses the statement cache, and its PreparedStatement
+    # is invalidated when the connection goes back to the pool. executemany
+    # with no rows parses and describes the query into the cache without
+    # executing it, so later fetch/execute calls on the same text reuse it.
+    for name in PREPARED:
+        await conn.executemany(QUERIES[name], [])
+
+async def create_schema(conn):
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS alerts (
+            address TEXT PRIMARY KEY,
+            message_id BIGINT,
+            initial_market_cap DOUBLE PRECISION,
+            chat_id BIGINT,
+            bot_name TEXT,
+            timestamp TEXT,
+            bonded BOOLEAN DEFAULT FALSE,
+            closed BOOLEAN DEFAULT FALSE,
+            last_market_cap DOUBLE PRECISION DEFAULT 0,
+            max_threshold DOUBLE PRECISION DEFAULT 0,
+            max_multiple DOUBLE PRECISION DEFAULT 0
+        )
+    ''')
+    await conn.execute('''
+        ALTER TABLE alerts
+            ADD COLUMN IF NOT EXISTS last_market_cap DOUBLE PRECISION DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS max_threshold DOUBLE PRECISION DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS max_multiple DOUBLE PRECISION DEFAULT 0
+    ''')
+    # Feeds the in-memory open-alert store (alert_store.py)
+    await conn.execute('''
+        CREATE OR REPLACE FUNCTION notify_alert_change() RETURNS trigger AS $$
+        BEGIN
+            -- Market-cap-only updates from the sweep are not worth a notification
+            IF TG_OP = 'UPDATE' AND NEW.bonded = OLD.bonded AND NEW.closed = OLD.closed
+               AND NEW.initial_market_cap IS NOT DISTINCT FROM OLD.initial_market_cap
+               AND NEW.max_threshold IS NOT DISTINCT FROM OLD.max_threshold
+               AND NEW.max_multiple IS NOT DISTINCT FROM OLD.max_multiple THEN
+                RETURN NULL;
+            END IF;
+            PERFORM pg_notify('alerts_changed', json_build_object(
+                'op', TG_OP,
+                'row', row_to_json(CASE WHEN TG_OP = 'DELETE' THEN OLD ELSE NEW END)
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    await conn.execute('''
+        DROP TRIGGER IF EXISTS alerts_notify ON alerts;
+        CREATE TRIGGER alerts_notify AFTER INSERT OR UPDATE OR DELETE ON alerts
+            FOR EACH ROW EXECUTE FUNCTION notify_alert_change()
+    ''')
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_calls (
+            user_id BIGINT,
+            address TEXT,
+            initial_market_cap DOUBLE PRECISION,
+            timestamp TEXT,
+            bonded BOOLEAN DEFAULT FALSE,
+            peak_market_cap DOUBLE PRECISION DEFAULT 0,
+            migrated BOOLEAN DEFAULT FALSE,
+            PRIMARY KEY (user_id, address)
+        )
+    ''')
+    # Calls stored with Telethon's marked sender ids (-100... for channels,
+    # -id for basic groups) go back to the bare ids used everywhere else
+    await conn.execute('''
+        UPDATE user_calls c
+        SET user_id = CASE WHEN c.user_id <= -1000000000000 THEN -c.user_id - 1000000000000 ELSE -c.user_id END
+        WHERE c.user_id < 0 AND NOT EXISTS (
+            SELECT 1 FROM user_calls o
+            WHERE o.address = c.address
+              AND o.user_id = CASE WHEN c.user_id <= -1000000000000 THEN -c.user_id - 1000000000000 ELSE -c.user_id END
+        )
+    ''')
+    await conn.execute("DELETE FROM user_calls WHERE user_id < 0")
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS keywords (
+            user_id BIGINT,
+            keyword TEXT,
+            PRIMARY KEY (user_id, keyword)
+        )
+    ''')
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS alert_traces (
+            id BIGSERIAL PRIMARY KEY,
+            kind TEXT,
+            address TEXT,
+            started_at TEXT,
+            total_ms DOUBLE PRECISION,
+            outcome TEXT,
+            spans JSONB
+        )
+    ''')
+    await conn.execute("CREATE INDEX IF NOT EXISTS alert_traces_started_at ON alert_traces (started_at)")
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS uptime_config (
+            id SERIAL PRIMARY KEY,
+            url TEXT,
+            last_ping TEXT,
+            status TEXT
+        )
+    ''')
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS uptime_targets (
+            url TEXT PRIMARY KEY,
+            last_ping TEXT,
+            status TEXT,
+            checks INTEGER DEFAULT 0,
+            availability DOUBLE PRECISION,
+            p50_ms DOUBLE PRECISION,
+            p95_ms DOUBLE PRECISION
+        )
+    ''')
+    logger.info("Database schema initialized")
 
 async def init_db():
-    global _pool
+    global _pool, _limiter, _loop
     if _pool is None:
+        # Schema first: the pool prepares statements against these tables on connect
+        conn = await asyncpg.connect(os.getenv("DATABASE_URL"))
+        try:
+            await create_schema(conn)
+        finally:
+            await conn.close()
         _pool = await asyncpg.create_pool(
             dsn=os.getenv("DATABASE_URL"),
-            min_size=1,
-            max_size=10
+            min_size=POOL_MIN,
+            max_size=POOL_MAX,
+            max_queries=MAX_QUERIES,
+            max_inactive_connection_lifetime=MAX_INACTIVE_LIFETIME,
+            init=_prepare
         )
-        async with _pool.acquire() as conn:
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS alerts (
-                    address TEXT PRIMARY KEY,
-                    message_id BIGINT,
-                    initial_market_cap DOUBLE PRECISION,
-                    chat_id BIGINT,
-                    bot_name TEXT,
-                    timestamp TEXT,
-                    bonded BOOLEAN DEFAULT FALSE,
-                    closed BOOLEAN DEFAULT FALSE
-                )
-            ''')
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS user_calls (
-                    user_id BIGINT,
-                    address TEXT,
-                    initial_market_cap DOUBLE PRECISION,
-                    timestamp TEXT,
-                    bonded BOOLEAN DEFAULT FALSE,
-                    peak_market_cap DOUBLE PRECISION DEFAULT 0,
-                    migrated BOOLEAN DEFAULT FALSE,
-                    PRIMARY KEY (user_id, address)
-                )
-            ''')
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS keywords (
-                    user_id BIGINT,
-                    keyword TEXT,
-                    PRIMARY KEY (user_id, keyword)
-                )
-            ''')
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS uptime_config (
-                    id SERIAL PRIMARY KEY,
-                    url TEXT,
-                    last_ping TEXT,
-                    status TEXT
-                )
-            ''')
-            logger.info("Database schema initialized")
+        _limiter = PoolLimiter(POOL_MAX)
+        _loop = asyncio.get_running_loop()
 
 async def get_db_connection():
     global _pool
@@ -60,8 +237,134 @@ async def get_db_connection():
         await init_db()
     return _pool
 
+@asynccontextmanager
+async def acquire(name: str):
+    """Pool connection gated by the tuned limit; the wait is recorded under `name`."""
+    pool = await get_db_connection()
+    started = time.perf_counter()
+    await _limiter.acquire()
+    try:
+        async with pool.acquire() as conn:
+            _stats.setdefault(name, QueryStats()).waited((time.perf_counter() - started) * 1000)
+            yield conn
+    finally:
+        await _limiter.release()
+
+async def _run(method: str, name: str, args: tuple, conn=None):
+    if conn is None:
+        async with acquire(name) as conn:
+            return await _run(method, name, args, conn)
+    stats = _stats.setdefault(name, QueryStats())
+    started = time.perf_counter()
+    failed = True
+    try:
+        result = await getattr(conn, method)(QUERIES[name], *args)
+        failed = False
+        return result
+    finally:
+        stats.ran((time.perf_counter() - started) * 1000, failed)
+
+async def fetch(name: str, *args, conn=None):
+    return await _run("fetch", name, args, conn)
+
+async def fetchrow(name: str, *args, conn=None):
+    return await _run("fetchrow", name, args, conn)
+
+async def fetchval(name: str, *args, conn=None):
+    return await _run("fetchval", name, args, conn)
+
+async def execute(name: str, *args, conn=None):
+    return await _run("execute", name, args, conn)
+
+async def executemany(name: str, rows: list, conn=None):
+    return await _run("executemany", name, (rows,), conn)
+
+def query_stats() -> Dict[str, dict]:
+    return dict(sorted(
+        ((name, stats.to_dict()) for name, stats in list(_stats.items())),
+        key=lambda item: item[1]["total_query_ms"], reverse=True
+    ))
+
+def pool_stats() -> dict:
+    pool, limiter = _pool, _limiter
+    if pool is None or limiter is None:
+        return {"size": 0, "min": POOL_MIN, "max": POOL_MAX}
+    return {
+        "size": pool.get_size(),
+        "idle": pool.get_idle_size(),
+        "min": POOL_MIN,
+        "max": POOL_MAX,
+        "limit": limiter.limit,
+        "in_use": limiter.in_use,
+        "waiting": limiter.waiting,
+    }
+
+async def health(timeout: float = 2.0) -> dict:
+    """SELECT 1 through the pool within `timeout` seconds, plus pool stats.
+    Must run on the loop that owns the pool; other threads read the result
+    through `last_health`."""
+    global _last_health
+    started = time.perf_counter()
+    result = {"status": "ok"}
+    try:
+        await asyncio.wait_for(fetchval("ping"), timeout)
+    except Exception as e:
+        result = {"status": "error", "error": str(e) or type(e).__name__}
+    result["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    result["checked_at"] = time.time()
+    _last_health = result
+    return {**result, "pool": pool_stats()}
+
+def last_health() -> dict:
+    """Latest `health` result plus current pool stats, without any I/O.
+    A result older than three check intervals is reported as stale."""
+    result = dict(_last_health)
+    if result.get("checked_at") and time.time() - result["checked_at"] > 3 * HEALTH_INTERVAL:
+        result["status"] = "stale"
+    result["pool"] = pool_stats()
+    return result
+
+async def monitor_health(interval: float = HEALTH_INTERVAL):
+    while True:
+        await health()
+        await asyncio.sleep(interval)
+
+async def tune_pool(interval: float = TUNE_INTERVAL):
+    """Grow the connection limit when acquires queued in the last window,
+    shrink it by one when peak use stayed at half the limit or less."""
+    while True:
+        await asyncio.sleep(interval)
+        if _limiter is None:
+            continue
+        limit = _limiter.limit
+        if _limiter.window_waits:
+            target = min(POOL_MAX, limit + max(1, limit // 2))
+        elif _limiter.window_peak <= limit // 2:
+            target = max(POOL_MIN, limit - 1)
+        else:
+            target = limit
+        if target != limit:
+            logger.info(
+                f"DB pool limit {limit} -> {target} "
+                f"({_limiter.window_waits}/{_limiter.window_acquires} acquires waited, peak {_limiter.window_peak})"
+            )
+            await _limiter.resize(target)
+        _limiter.reset_window()
+
+def run_on_pool_loop(coro, timeout: float = 10.0):
+    """Run `coro` on the loop that owns the pool and wait for its result.
+    For other threads (Flask views): the pool and its limiter must not be
+    used from any other event loop."""
+    loop = _loop
+    if loop is None or loop.is_closed():
+        coro.close()
+        raise RuntimeError("Database not initialized")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout)
+
 async def close_db():
-    global _pool
+    global _pool, _limiter, _loop
     if _pool:
         await _pool.close()
         _pool = None
+        _limiter = None
+        _loop = None
@@ -0,0 +1,71 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from telethon.utils import resolve_id
+
+def plain_sender_id(event) -> Optional[int]:
+    """The sender's bare positive id, as `sender.id` gives it. event.sender_id
+    is Telethon's marked id, which is -100... for channels."""
+    return None if event.sender_id is None else resolve_id(event.sender_id)[0]
+
+class SenderCache:
+    """Bounded LRU of resolved sender display names with a TTL, so busy chats
+    do not cost a Telegram entity lookup per message. Channel-caller names
+    are kept alongside and applied at lookup time, so changing one takes
+    effect immediately."""
+
+    def __init__(self, max_size: int = 10_000, ttl: float = 3600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.names: "OrderedDict[int, tuple[float, str]]" = OrderedDict()
+        self.channel_callers: Dict[int, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, sender_id: int) -> Optional[str]:
+        entry = self.names.get(sender_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self.names[sender_id]
+            self.misses += 1
+            return None
+        self.names.move_to_end(sender_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, sender_id: int, name: str):
+        self.names[sender_id] = (time.monotonic() + self.ttl, name)
+        self.names.move_to_end(sender_id)
+        while len(self.names) > self.max_size:
+            self.names.popitem(last=False)
+            self.evictions += 1
+
+    async def display_name(self, event) -> str:
+        """Caller name for a message: the sender's name, else the channel's
+        registered caller, else "Unknown Caller"."""
+        name = self.get(event.sender_id)
+        if name is None:
+            sender = await event.get_sender()
+            # Channels and anonymous admins have no first/last name
+            name = f"{getattr(sender, 'first_name', None) or ''} {getattr(sender, 'last_name', None) or ''}".strip()
+            self.put(event.sender_id, name)
+        if not name:
+            name = self.channel_callers.get(event.chat_id, "")
+        return name or "Unknown Caller"
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.names),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+sender_cache = SenderCache(
+    max_size=int(os.getenv("SENDER_CACHE_SIZE", 10_000)),
+    ttl=float(os.getenv("SENDER_CACHE_TTL", 3600)),
+)
@@ -0,0 +1,113 @@
+import os
+import queue
+import asyncio
+import threading
+import zlib
+from typing import Awaitable, Callable, Iterator, Optional, Tuple
+import asyncpg
+
+# Exportable tables and the column time windows are applied to
+EXPORT_TABLES = {"alerts": "timestamp", "user_calls": "timestamp"}
+EXPORT_FORMATS = ("csv", "ndjson")
+EXPORT_GZIP_LEVEL = int(os.getenv("EXPORT_GZIP_LEVEL", 6))
+
+def export_query(table: str, fmt: str, since: Optional[str] = None, until: Optional[str] = None) -> Tuple[str, list, dict]:
+    """COPY source query, its arguments and COPY options for one export.
+
+    Timestamps are stored as ISO-8601 UTC text, so windows compare as strings.
+    NDJSON is produced by Postgres itself (row_to_json) and copied out as CSV
+    with quote and delimiter set to bytes that never occur in JSON text, so
+    each line is the JSON document unchanged."""
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unknown table {table!r}")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}")
+    column = EXPORT_TABLES[table]
+    conditions, args = [], []
+    if since:
+        args.append(since)
+        conditions.append(f"{column} >= ${len(args)}")
+    if until:
+        args.append(until)
+        conditions.append(f"{column} < ${len(args)}")
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    select = f"SELECT * FROM {table}{where}"
+    if fmt == "csv":
+        return select, args, {"format": "csv", "header": True}
+    return f"SELECT row_to_json(t)::text FROM ({select}) t", args, {"format": "csv", "quote": "\x01", "delimiter": "\x02"}
+
+async def copy_export(conn, output: Callable[[bytes], Awaitable[None]], table: str, fmt: str, since: Optional[str] = None, until: Optional[str] = None) -> str:
+    """Stream `table` through COPY ... TO STDOUT into `output`, chunk by chunk."""
+    query, args, options = export_query(table, fmt, since, until)
+    return await conn.copy_from_query(query, *args, output=output, **options)
+
+async def export_to_file(path: str, table: str, fmt: str, since: Optional[str] = None, until: Optional[str] = None) -> int:
+    """Write a gzip-compressed export to `path` and return its size in bytes.
+
+    Runs off the event loop: compression and file writes happen in a thread,
+    and the COPY uses stream_export's own connection rather than the pool."""
+    def write() -> int:
+        with open(path, "wb") as f:
+            for chunk in stream_export(table, fmt, since, until, compress=True):
+                f.write(chunk)
+        return os.path.getsize(path)
+    return await asyncio.to_thread(write)
+
+def stream_export(table: str, fmt: str, since: Optional[str] = None, until: Optional[str] = None, compress: bool = False, max_chunks: int = 16) -> Iterator[bytes]:
+    """Synchronous chunk iterator for WSGI responses.
+
+    The COPY runs on its own connection and event loop in a worker thread and
+    hands chunks over a bounded queue, so memory stays at `max_chunks` chunks
+    and a slow client slows the COPY down instead of buffering the table.
+    Closing the iterator (client disconnect) aborts the COPY."""
+    export_query(table, fmt, since, until)  # validate before starting the worker
+    chunks: queue.Queue = queue.Queue(maxsize=max_chunks)
+    cancelled = threading.Event()
+    done = object()
+
+    def offer(item) -> bool:
+        """Queue `item` unless the consumer has gone away."""
+        while not cancelled.is_set():
+            try:
+                chunks.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    async def run():
+        conn = await asyncpg.connect(os.getenv("DATABASE_URL"))
+        try:
+            async def put(chunk: bytes):
+                # Blocking here is fine: this loop only serves the one COPY
+                if not offer(chunk):
+                    raise asyncio.CancelledError()
+            await copy_export(conn, put, table, fmt, since, until)
+        finally:
+            await conn.close()
+
+    def worker():
+        try:
+            asyncio.run(run())
+            offer(done)
+        except BaseException as e:
+            offer(e)
+
+    threading.Thread(target=worker, daemon=True).start()
+    compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, wbits=31) if compress else None
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is done:
+                break
+            if isinstance(chunk, BaseException):
+                raise chunk
+            if compressor:
+                chunk = compressor.compress(chunk)
+                if not chunk:
+                    continue
+            yield chunk
+        if compressor:
+            yield compressor.flush()
+    finally:
+        cancelled.set()
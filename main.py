@@ -3,16 +3,24 @@ import asyncio
 import logging
 import signal
 import sys
+import tempfile
 from dotenv import load_dotenv
 from telethon import TelegramClient, events
 from telethon import types
 from typing import List, Set
 from bot import UserBot, monitor_market_cap, monitor_messages, MARKET_CAP_THRESHOLDS
-from db import init_db, get_db_connection, close_db
+import db
+from db import init_db, close_db, tune_pool, monitor_health
+from upstream import close_session
+from write_buffer import write_buffer
+from alert_store import alert_store
+from entity_cache import sender_cache, plain_sender_id
+from tracing import tracer
+from uptime import uptime_monitor
+from export import export_to_file, EXPORT_TABLES, EXPORT_FORMATS
 from utils import calculate_hitrate, format_value, format_percentage, format_time_diff, format_market_cap
 from api import app as flask_app
-from datetime import datetime, timezone
-from aiolimiter import AsyncLimiter
+from datetime import datetime, timezone, timedelta
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -32,13 +40,10 @@ monitored_channels: Set[int] = set()
 admins: Set[int] = {123456789}  # Replace with your admin ID
 userbots: List[UserBot] = []
 assignments: dict[int, str] = {}
-channel_callers: dict[int, str] = {}
-uptime_url = None
-rate_limiter = AsyncLimiter(10, 1)  # 10 requests per second
+channel_callers: dict[int, str] = sender_cache.channel_callers
 
 async def check_admin(event):
-    sender = await event.get_sender()
-    return sender and sender.id in admins
+    return plain_sender_id(event) in admins
 
 async def handle_add_chat(message: types.Message):
     if not await check_admin(message): return await message.reply("Admins only.")
@@ -187,9 +192,7 @@ async def handle_add_keyword(message: types.Message):
     try:
         user_id = int(args[1])
         keyword = args[2]
-        pool = await get_db_connection()
-        async with pool.acquire() as conn:
-            await conn.execute("INSERT INTO keywords (user_id, keyword) VALUES ($1, $2) ON CONFLICT DO NOTHING", user_id, keyword)
+        await db.execute("keyword_insert", user_id, keyword)
         await message.reply(f"Added keyword '{keyword}' for user {user_id}")
     except ValueError:
         await message.reply("Invalid user_id.")
@@ -201,18 +204,14 @@ async def handle_remove_keyword(message: types.Message):
     try:
         user_id = int(args[1])
         keyword = args[2]
-        pool = await get_db_connection()
-        async with pool.acquire() as conn:
-            await conn.execute("DELETE FROM keywords WHERE user_id = $1 AND keyword = $2", user_id, keyword)
+        await db.execute("keyword_delete", user_id, keyword)
         await message.reply(f"Removed keyword '{keyword}' for user {user_id}")
     except ValueError:
         await message.reply("Invalid user_id.")
 
 async def handle_list_keywords(message: types.Message):
     if not await check_admin(message): return await message.reply("Admins only.")
-    pool = await get_db_connection()
-    async with pool.acquire() as conn:
-        keywords = await conn.fetch("SELECT user_id, keyword FROM keywords")
+    keywords = await db.fetch("keywords_all")
     response = "\n".join(f"User {k['user_id']}: {k['keyword']}" for k in keywords) or "No keywords."
     await message.reply(f"Keywords:\n{response}")
 
@@ -229,7 +228,7 @@ async def handle_add_admin(message: types.Message):
 
 async def handle_list_configuration(message: types.Message):
     if not await check_admin(message): return await message.reply("Admins only.")
-    response = f"Target Users: {len(target_users)}\nTarget Chats: {len(target_chats)}\nMonitored Channels: {len(monitored_channels)}\nBots: {len(userbots)}\nUptime URL: {uptime_url}"
+    response = f"Target Users: {len(target_users)}\nTarget Chats: {len(target_chats)}\nMonitored Channels: {len(monitored_channels)}\nBots: {len(userbots)}\nUptime URLs: {', '.join(uptime_monitor.targets) or None}"
     await message.reply(response)
 
 async def handle_test(message: types.Message):
@@ -245,18 +244,18 @@ async def handle_test(message: types.Message):
         await message.reply(f"Market Cap for {address}: {mc_str}")
     elif test_type == "bonded":
         is_bonded, progress = await fetch_bonding_status(address)
-        await message.reply(f"Bonding Status for {address}: {'Bonded' if is_bonded else 'Not Bonded'} ({progress}%)")
+        if is_bonded is None:
+            await message.reply(f"Bonding Status for {address}: Unknown (Moralis and on-chain lookup unavailable)")
+        else:
+            await message.reply(f"Bonding Status for {address}: {'Bonded' if is_bonded else 'Not Bonded'} ({progress}%)")
     elif test_type == "hypothetical" and len(args) == 4:
         try:
             hypo_mc = float(args[3].replace("m", "e6").replace("b", "e9"))
             mc_str = await format_market_cap(hypo_mc)
-            pool = await get_db_connection()
-            async with pool.acquire() as conn:
-                await conn.execute(
-                    "INSERT INTO alerts (address, message_id, initial_market_cap, chat_id, bot_name, timestamp, bonded) "
-                    "VALUES ($1, $2, $3, $4, $5, $6, $7) ON CONFLICT (address) DO UPDATE SET initial_market_cap = $3",
-                    address, message.id, hypo_mc / 2, message.chat_id, "test_bot", datetime.now(timezone.utc).isoformat(), False
-                )
+            await db.execute(
+                "alert_upsert_hypothetical",
+                address, message.id, hypo_mc / 2, message.chat_id, "test_bot", datetime.now(timezone.utc).isoformat(), False
+            )
             await message.reply(f"Set {address} with hypothetical MC {mc_str} (initial {await format_market_cap(hypo_mc / 2)}).")
         except ValueError:
             await message.reply("Invalid value. Use e.g., 1m, 1b.")
@@ -281,56 +280,71 @@ async def handle_stats_history(message: types.Message):
     if len(args) < 2: return await message.reply("Usage: /stats_history {user_id}")
     try:
         user_id = int(args[1])
-        pool = await get_db_connection()
-        async with pool.acquire() as conn:
-            calls = await conn.fetch("SELECT address, timestamp, initial_market_cap FROM user_calls WHERE user_id = $1 ORDER BY timestamp DESC LIMIT 5", user_id)
+        calls = await db.fetch("calls_recent", user_id)
         response = "\n".join(f"{c['address']} at {c['timestamp']}: {await format_market_cap(c['initial_market_cap'])}" for c in calls) or "No history."
         await message.reply(f"Recent calls for {user_id}:\n{response}")
     except ValueError:
         await message.reply("Invalid user ID.")
 
+async def handle_cache_stats(message: types.Message):
+    if not await check_admin(message): return await message.reply("Admins only.")
+    stats = sender_cache.stats()
+    await message.reply(
+        f"Sender cache: {stats['size']} entries\nHit rate: {stats['hit_rate']:.1%} "
+        f"({stats['hits']} hits, {stats['misses']} misses)\nEvictions: {stats['evictions']}"
+    )
+
+async def handle_slow_traces(message: types.Message):
+    if not await check_admin(message): return await message.reply("Admins only.")
+    args = message.text.split(maxsplit=1)
+    try:
+        limit = int(args[1]) if len(args) > 1 else 5
+    except ValueError:
+        return await message.reply("Usage: /slow_traces {count}")
+    traces = tracer.slowest(limit)
+    if not traces:
+        return await message.reply("No traces yet.")
+    lines = []
+    for trace in traces:
+        steps = ", ".join(f"{name} {ms:.0f}ms" for name, ms in sorted(trace.spans, key=lambda span: span[1], reverse=True)[:3])
+        lines.append(f"{trace.kind} {trace.address[:8]}… {trace.total_ms:.0f}ms ({steps})")
+    breakdown = "\n".join(f"{step}: avg {stats['avg_ms']:.0f}ms, p95 {stats['p95_ms']:.0f}ms" for step, stats in tracer.breakdown().items())
+    await message.reply("Slowest alerts:\n" + "\n".join(lines) + f"\n\nPer step:\n{breakdown}")
+
+async def handle_export(message: types.Message):
+    if not await check_admin(message): return await message.reply("Admins only.")
+    args = message.text.split()
+    usage = f"Usage: /export {{{'|'.join(EXPORT_TABLES)}}} [{'|'.join(EXPORT_FORMATS)}] [days]"
+    if len(args) < 2 or args[1] not in EXPORT_TABLES: return await message.reply(usage)
+    fmt = args[2] if len(args) > 2 else "csv"
+    if fmt not in EXPORT_FORMATS: return await message.reply(usage)
+    try:
+        since = (datetime.now(timezone.utc) - timedelta(days=int(args[3]))).isoformat() if len(args) > 3 else None
+    except ValueError:
+        return await message.reply(usage)
+    path = os.path.join(tempfile.gettempdir(), f"{args[1]}-{datetime.now(timezone.utc):%Y%m%d%H%M%S}.{fmt}.gz")
+    try:
+        size = await export_to_file(path, args[1], fmt, since)
+        await message.reply(f"Export of {args[1]} ({size / 1_000_000:.1f} MB gzip)", file=path)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
 async def handle_set_uptime_url(message: types.Message):
     if not await check_admin(message): return await message.reply("Admins only.")
     args = message.text.split(maxsplit=1)
     if len(args) < 2: return await message.reply("Usage: /set_uptime_url {url}")
-    global uptime_url
-    uptime_url = args[1]
-    pool = await get_db_connection()
-    async with pool.acquire() as conn:
-        await conn.execute(
-            "INSERT INTO uptime_config (url, last_ping, status) VALUES ($1, $2, $3) "
-            "ON CONFLICT (id) DO UPDATE SET url = $1, last_ping = $2, status = $3",
-            uptime_url, None, "unknown"
-        )
-    await message.reply(f"Set uptime URL to {uptime_url}")
-
-async def check_uptime():
-    async with aiohttp.ClientSession() as session:
-        while True:
-            if uptime_url:
-                async with rate_limiter:
-                    try:
-                        async with session.get(uptime_url, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                            status = "up" if response.status == 200 else "down"
-                            last_ping = datetime.now(timezone.utc).isoformat()
-                            pool = await get_db_connection()
-                            async with pool.acquire() as conn:
-                                await conn.execute(
-                                    "INSERT INTO uptime_config (url, last_ping, status) VALUES ($1, $2, $3) "
-                                    "ON CONFLICT (id) DO UPDATE SET last_ping = $2, status = $3",
-                                    uptime_url, last_ping, status
-                                )
-                            logger.info(f"Uptime check: {status} ({response.status})")
-                    except Exception as e:
-                        pool = await get_db_connection()
-                        async with pool.acquire() as conn:
-                            await conn.execute(
-                                "INSERT INTO uptime_config (url, last_ping, status) VALUES ($1, $2, $3) "
-                                "ON CONFLICT (id) DO UPDATE SET last_ping = $2, status = $3",
-                                uptime_url, datetime.now(timezone.utc).isoformat(), "error"
-                            )
-                        logger.error(f"Uptime check failed: {e}")
-            await asyncio.sleep(300)
+    await uptime_monitor.register(args[1])
+    await message.reply(f"Added uptime URL {args[1]} ({len(uptime_monitor.targets)} monitored)")
+
+async def handle_remove_uptime_url(message: types.Message):
+    if not await check_admin(message): return await message.reply("Admins only.")
+    args = message.text.split(maxsplit=1)
+    if len(args) < 2: return await message.reply("Usage: /remove_uptime_url {url}")
+    if await uptime_monitor.unregister(args[1]):
+        await message.reply(f"Removed uptime URL {args[1]}")
+    else:
+        await message.reply(f"Uptime URL {args[1]} not found.")
 
 async def start_bot():
     await init_db()
@@ -341,9 +355,14 @@ async def start_bot():
 
     await handle_reload_bots(None)
 
+    asyncio.create_task(alert_store.listen())
     management_bot.add_event_handler(lambda event: monitor_messages(event, userbots, target_users, target_chats), events.NewMessage())
     asyncio.create_task(monitor_market_cap(userbots))
-    asyncio.create_task(check_uptime())
+    asyncio.create_task(uptime_monitor.run())
+    asyncio.create_task(write_buffer.run())
+    asyncio.create_task(tracer.run())
+    asyncio.create_task(tune_pool())
+    asyncio.create_task(monitor_health())
     logger.info("Started monitoring tasks")
 
     await management_bot.run_until_disconnected()
@@ -354,6 +373,11 @@ async def shutdown():
         await bot.stop()
     if management_bot.is_connected():
         await management_bot.disconnect()
+    await close_session()
+    await write_buffer.flush()
+    await tracer.flush()
+    await uptime_monitor.persist()
+    await alert_store.close()
     await close_db()
     logger.info("Shutdown complete")
 
@@ -390,6 +414,10 @@ if __name__ == "__main__":
         r'^/stats(?:\s+(.+))?$': handle_stats,
         r'^/stats_history(?:\s+(.+))?$': handle_stats_history,
         r'^/set_uptime_url(?:\s+(.+))?$': handle_set_uptime_url,
+        r'^/remove_uptime_url(?:\s+(.+))?$': handle_remove_uptime_url,
+        r'^/cache_stats$': handle_cache_stats,
+        r'^/slow_traces(?:\s+(.+))?$': handle_slow_traces,
+        r'^/export(?:\s+(.+))?$': handle_export,
     }
     for pattern, handler in handlers.items():
         management_bot.on(events.NewMessage(pattern=pattern))(handler)
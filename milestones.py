@@ -0,0 +1,39 @@
+import os
+from typing import Sequence, Tuple
+import numpy as np
+
+class MilestoneEngine:
+    """Finds, for a whole sweep at once, the highest market-cap threshold and
+    the highest multiple of the initial market cap each alert newly reached.
+
+    High-water marks are passed in per alert (highest threshold / multiple
+    already fired), so a milestone fires exactly once however long the token
+    stays above it. 0 in an output array means nothing new was crossed."""
+
+    def __init__(self, thresholds: Sequence[float], multiples: Sequence[float]):
+        self.thresholds = np.sort(np.asarray(thresholds, dtype=np.float64))
+        self.multiples = np.sort(np.asarray(multiples, dtype=np.float64))
+
+    @staticmethod
+    def _crossed(levels: np.ndarray, floor: np.ndarray, value: np.ndarray) -> np.ndarray:
+        if not len(levels):
+            return np.zeros(len(value))
+        first_above_floor = np.searchsorted(levels, floor, side="right")
+        reached = np.searchsorted(levels, value, side="right")
+        hit = reached > first_above_floor
+        return np.where(hit, levels[np.maximum(reached - 1, 0)], 0.0)
+
+    def detect(self, initial_mc, max_threshold, max_multiple, market_cap) -> Tuple[np.ndarray, np.ndarray]:
+        initial_mc = np.asarray(initial_mc, dtype=np.float64)
+        market_cap = np.asarray(market_cap, dtype=np.float64)
+        thresholds = self._crossed(
+            self.thresholds, np.maximum(initial_mc, np.asarray(max_threshold, dtype=np.float64)), market_cap
+        )
+        ratio = np.divide(market_cap, initial_mc, out=np.zeros_like(market_cap), where=initial_mc > 0)
+        multiples = self._crossed(self.multiples, np.asarray(max_multiple, dtype=np.float64), ratio)
+        return thresholds, multiples
+
+def parse_multiples(value: str) -> list[float]:
+    return [float(part.strip().rstrip("xX")) for part in value.split(",") if part.strip()]
+
+MILESTONE_MULTIPLES = parse_multiples(os.getenv("MILESTONE_MULTIPLES", "2,5,10"))
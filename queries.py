@@ -0,0 +1,63 @@
+# Every SQL statement the bot runs, by name. Run them through the helpers in
+# db.py so acquire-wait and query time are tracked per name.
+QUERIES = {
+    # alerts
+    "alert_open": "SELECT * FROM alerts WHERE address = $1 AND NOT closed",
+    "alerts_open_all": (
+        "SELECT address, message_id, initial_market_cap, chat_id, bot_name, timestamp, bonded, "
+        "last_market_cap, max_threshold, max_multiple FROM alerts WHERE NOT closed"
+    ),
+    "alerts_recent": "SELECT * FROM alerts WHERE NOT closed ORDER BY timestamp DESC LIMIT 10",
+    "alert_insert": (
+        "INSERT INTO alerts (address, message_id, initial_market_cap, chat_id, bot_name, timestamp, bonded) "
+        "VALUES ($1, $2, $3, $4, $5, $6, $7) ON CONFLICT (address) DO NOTHING"
+    ),
+    "alert_upsert_hypothetical": (
+        "INSERT INTO alerts (address, message_id, initial_market_cap, chat_id, bot_name, timestamp, bonded) "
+        "VALUES ($1, $2, $3, $4, $5, $6, $7) ON CONFLICT (address) DO UPDATE SET initial_market_cap = $3"
+    ),
+    "alerts_mark_bonded": "UPDATE alerts SET bonded = TRUE WHERE address = ANY($1::text[])",
+    "alert_progress": "UPDATE alerts SET last_market_cap = $1, max_threshold = $2, max_multiple = $3 WHERE address = $4",
+    # user_calls
+    "call_insert": (
+        "INSERT INTO user_calls (user_id, address, initial_market_cap, timestamp, bonded) "
+        "VALUES ($1, $2, $3, $4, $5) ON CONFLICT (user_id, address) DO NOTHING"
+    ),
+    "calls_since": "SELECT * FROM user_calls WHERE user_id = $1 AND timestamp >= $2",
+    "calls_recent": "SELECT address, timestamp, initial_market_cap FROM user_calls WHERE user_id = $1 ORDER BY timestamp DESC LIMIT 5",
+    # keywords
+    "keyword_insert": "INSERT INTO keywords (user_id, keyword) VALUES ($1, $2) ON CONFLICT DO NOTHING",
+    "keyword_delete": "DELETE FROM keywords WHERE user_id = $1 AND keyword = $2",
+    "keywords_all": "SELECT user_id, keyword FROM keywords",
+    # alert_traces
+    "trace_insert": (
+        "INSERT INTO alert_traces (kind, address, started_at, total_ms, outcome, spans) "
+        "VALUES ($1, $2, $3, $4, $5, $6::jsonb)"
+    ),
+    "traces_prune": "DELETE FROM alert_traces WHERE started_at < $1",
+    # uptime
+    "uptime_targets_all": "SELECT url FROM uptime_targets UNION SELECT DISTINCT url FROM uptime_config WHERE url IS NOT NULL",
+    "uptime_target_insert": "INSERT INTO uptime_targets (url, status) VALUES ($1, 'unknown') ON CONFLICT (url) DO NOTHING",
+    "uptime_target_delete": "DELETE FROM uptime_targets WHERE url = $1",
+    "uptime_config_delete": "DELETE FROM uptime_config WHERE url = $1",
+    "uptime_summary_upsert": (
+        "INSERT INTO uptime_targets (url, last_ping, status, checks, availability, p50_ms, p95_ms) "
+        "VALUES ($1, $2, $3, $4, $5, $6, $7) "
+        "ON CONFLICT (url) DO UPDATE SET last_ping = $2, status = $3, checks = $4, availability = $5, p50_ms = $6, p95_ms = $7"
+    ),
+    "ping": "SELECT 1",
+}
+
+# Prepared on every new pool connection, so the first call on a fresh
+# connection skips the parse/plan round trip.
+PREPARED = (
+    "alert_open",
+    "alert_insert",
+    "alerts_mark_bonded",
+    "alert_progress",
+    "call_insert",
+    "calls_since",
+    "alerts_recent",
+    "trace_insert",
+    "ping",
+)
@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import random
+import threading
+import asyncio
+import logging
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+import db
+from utils import percentile
+
+logger = logging.getLogger(__name__)
+
+class Trace:
+    """Timing spans for one address through monitor_messages ("message") or
+    one alert through a monitor_market_cap sweep ("sweep")."""
+    __slots__ = ("kind", "address", "started_at", "t0", "spans", "total_ms", "outcome", "paused_at")
+
+    def __init__(self, kind: str, address: str, t0: Optional[float] = None):
+        self.kind = kind
+        self.address = address
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.t0 = t0 if t0 is not None else time.perf_counter()
+        self.spans: List[tuple] = []
+        self.total_ms = 0.0
+        self.outcome = ""
+        self.paused_at: Optional[float] = None
+
+    def pause(self):
+        """Stop the clock; time until `resume` is left out of total_ms."""
+        self.paused_at = time.perf_counter()
+
+    def resume(self):
+        if self.paused_at is not None:
+            self.t0 += time.perf_counter() - self.paused_at
+            self.paused_at = None
+
+    @contextmanager
+    def span(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((name, (time.perf_counter() - started) * 1000))
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": self.kind,
+            "address": self.address,
+            "started_at": self.started_at,
+            "total_ms": round(self.total_ms, 2),
+            "outcome": self.outcome,
+            "spans": [{"step": name, "ms": round(ms, 2)} for name, ms in self.spans],
+        }
+
+# Sweep traces that posted nothing; a sweep produces one per open alert
+QUIET_SWEEP = ("quiet", "no_quote")
+
+class Tracer:
+    """Keeps finished traces in one ring buffer per kind, so a large sweep
+    cannot evict message traces, and stores every slow trace plus a sample
+    of posted ones in the alert_traces table for `retention_days`."""
+
+    def __init__(self, size: int = 2000, sample_rate: float = 0.1, flush_interval: float = 30.0,
+                 slow_ms: float = 5000, retention_days: float = 7):
+        self.size = size
+        self.recent: Dict[str, deque] = {}
+        self.lock = threading.Lock()  # /traces reads the rings from the Flask thread
+        self.sample_rate = sample_rate
+        self.flush_interval = flush_interval
+        self.slow_ms = slow_ms
+        self.retention_days = retention_days
+        self.pending: List[Trace] = []
+        self.last_prune = 0.0
+
+    def start(self, kind: str, address: str, t0: Optional[float] = None) -> Trace:
+        return Trace(kind, address, t0)
+
+    def finish(self, trace: Trace, outcome: str = "posted"):
+        trace.resume()
+        trace.total_ms = (time.perf_counter() - trace.t0) * 1000
+        trace.outcome = outcome
+        if trace.kind == "sweep" and outcome in QUIET_SWEEP:
+            return
+        with self.lock:
+            self.recent.setdefault(trace.kind, deque(maxlen=self.size)).append(trace)
+        if trace.total_ms >= self.slow_ms or (outcome == "posted" and random.random() < self.sample_rate):
+            self.pending.append(trace)
+
+    def _traces(self, kind: Optional[str]) -> List[Trace]:
+        with self.lock:
+            if kind is not None:
+                return list(self.recent.get(kind, ()))
+            return [trace for ring in self.recent.values() for trace in ring]
+
+    def slowest(self, limit: int = 10, kind: Optional[str] = None) -> List[Trace]:
+        traces = [t for t in self._traces(kind) if t.outcome == "posted"]
+        return sorted(traces, key=lambda t: t.total_ms, reverse=True)[:limit]
+
+    def breakdown(self, kind: Optional[str] = None) -> Dict[str, dict]:
+        steps: Dict[str, List[float]] = {}
+        for trace in self._traces(kind):
+            for name, ms in trace.spans:
+                steps.setdefault(name, []).append(ms)
+        result = {}
+        for name, values in steps.items():
+            result[name] = {
+                "count": len(values),
+                "avg_ms": round(sum(values) / len(values), 2),
+                "p95_ms": round(percentile(values, 0.95), 2),
+                "max_ms": round(max(values), 2),
+            }
+        return dict(sorted(result.items(), key=lambda item: item[1]["avg_ms"], reverse=True))
+
+    async def flush(self):
+        if not self.pending:
+            return
+        traces, self.pending = self.pending, []
+        try:
+            await db.executemany("trace_insert", [
+                (t.kind, t.address, t.started_at, t.total_ms, t.outcome, json.dumps(t.to_dict()["spans"]))
+                for t in traces
+            ])
+        except Exception as e:
+            logger.error(f"Failed to store {len(traces)} traces: {e}")
+
+    async def prune(self):
+        self.last_prune = time.monotonic()
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.retention_days)
+        try:
+            await db.execute("traces_prune", cutoff.isoformat())
+        except Exception as e:
+            logger.error(f"Failed to prune old traces: {e}")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if time.monotonic() - self.last_prune >= 3600:
+                await self.prune()
+
+tracer = Tracer(
+    size=int(os.getenv("TRACE_BUFFER_SIZE", 2000)),
+    sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", 0.1)),
+    flush_interval=float(os.getenv("TRACE_FLUSH_INTERVAL", 30)),
+    slow_ms=float(os.getenv("TRACE_SLOW_MS", 5000)),
+    retention_days=float(os.getenv("TRACE_RETENTION_DAYS", 7)),
+)
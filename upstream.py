@@ -0,0 +1,191 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Optional, Dict, Tuple
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+_session: Optional[aiohttp.ClientSession] = None
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and lets a single
+    trial request through once `reset_timeout` seconds have passed."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def release_trial(self):
+        """Give up a trial that ended without a result (e.g. cancelled)."""
+        self.trial_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+class Provider:
+    """An upstream HTTP API with its own timeout, latency window and breaker."""
+
+    def __init__(self, name: str, base_url: str, timeout: float, hedge_after: float, window: int = 200):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.hedge_after = hedge_after  # used until the latency window has enough samples
+        self.latencies: deque = deque(maxlen=window)
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv("UPSTREAM_BREAKER_FAILURES", 5)),
+            reset_timeout=float(os.getenv("UPSTREAM_BREAKER_RESET", 30)),
+        )
+        self.hedged = 0
+
+    def p95(self) -> Optional[float]:
+        from utils import percentile  # utils imports this module
+        if len(self.latencies) < 20:
+            return None
+        return percentile(self.latencies, 0.95)
+
+    def hedge_delay(self) -> float:
+        p95 = self.p95()
+        return min(p95, self.timeout) if p95 is not None else self.hedge_after
+
+    def stats(self) -> dict:
+        return {
+            "state": self.breaker.state,
+            "failures": self.breaker.failures,
+            "p95_ms": round(self.p95() * 1000, 1) if self.p95() is not None else None,
+            "hedged": self.hedged,
+        }
+
+PROVIDERS: Dict[str, Provider] = {
+    "dexscreener": Provider(
+        "dexscreener",
+        os.getenv("DEXSCREENER_URL", "https://api.dexscreener.com"),
+        timeout=float(os.getenv("DEXSCREENER_TIMEOUT", 4)),
+        hedge_after=1.0,
+    ),
+    "geckoterminal": Provider(
+        "geckoterminal",
+        os.getenv("GECKOTERMINAL_URL", "https://api.geckoterminal.com"),
+        timeout=float(os.getenv("GECKOTERMINAL_TIMEOUT", 4)),
+        hedge_after=1.0,
+    ),
+    "moralis": Provider(
+        "moralis",
+        os.getenv("MORALIS_URL", "https://deep-index.moralis.io"),
+        timeout=float(os.getenv("MORALIS_TIMEOUT", 4)),
+        hedge_after=1.0,
+    ),
+    "solana": Provider(
+        "solana",
+        os.getenv("SOLANA_RPC_URL", "https://api.mainnet-beta.solana.com"),
+        timeout=float(os.getenv("SOLANA_RPC_TIMEOUT", 4)),
+        hedge_after=1.0,
+    ),
+}
+
+async def get_session() -> aiohttp.ClientSession:
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession()
+    return _session
+
+async def close_session():
+    global _session
+    if _session and not _session.closed:
+        await _session.close()
+    _session = None
+
+async def _request(provider: Provider, path: str, headers: Optional[dict], body: Optional[dict] = None) -> Optional[dict]:
+    """One attempt, a GET or a POST of `body` as JSON. 5xx and 429 raise (they
+    count against the breaker); other non-200 answers such as a 404 for an
+    unknown token are a definitive "no data" and return None."""
+    session = await get_session()
+    started = time.monotonic()
+    timeout = aiohttp.ClientTimeout(total=provider.timeout)
+    url = f"{provider.base_url}{path}"
+    method = session.get(url, headers=headers, timeout=timeout) if body is None else session.post(url, headers=headers, json=body, timeout=timeout)
+    async with method as response:
+        if response.status == 429 or response.status >= 500:
+            raise aiohttp.ClientResponseError(
+                response.request_info, response.history, status=response.status
+            )
+        data = await response.json(content_type=None) if response.status == 200 else None
+    provider.latencies.append(time.monotonic() - started)
+    if data is None:
+        logger.debug(f"{provider.name} returned {response.status} for {path}")
+    return data
+
+async def get_json(provider_name: str, path: str, headers: Optional[dict] = None) -> Optional[dict]:
+    """GET `path` from a provider; None when there is no data for any reason.
+    See fetch_json to tell "no data" apart from "provider down"."""
+    _, data = await fetch_json(provider_name, path, headers)
+    return data
+
+async def fetch_json(provider_name: str, path: str, headers: Optional[dict] = None, body: Optional[dict] = None) -> Tuple[bool, Optional[dict]]:
+    """Request `path` from a provider, hedging with a second request once the
+    first has been outstanding longer than the provider's p95 latency. A
+    half-open trial is never hedged. Returns (answered, data): answered is
+    False when the breaker is open or both attempts failed, and data is None
+    as well when the provider answered with no data (4xx)."""
+    provider = PROVIDERS[provider_name]
+    if not provider.breaker.allow():
+        return False, None
+    trial = provider.breaker.trial_in_flight
+    tasks = [asyncio.ensure_future(_request(provider, path, headers, body))]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=None if trial else provider.hedge_delay())
+        if not done:
+            provider.hedged += 1
+            tasks.append(asyncio.ensure_future(_request(provider, path, headers, body)))
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    provider.breaker.record_success()
+                    return True, task.result()
+        error = tasks[-1].exception()
+        logger.warning(f"{provider.name} request failed: {type(error).__name__}: {error}")
+    finally:
+        if trial and provider.breaker.trial_in_flight:
+            provider.breaker.release_trial()  # cancelled before a result was recorded
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()  # mark the losing attempt's error as retrieved
+    provider.breaker.record_failure()
+    return False, None
+
+def upstream_stats() -> dict:
+    return {name: provider.stats() for name, provider in PROVIDERS.items()}
@@ -0,0 +1,135 @@
+import os
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import aiohttp
+from aiolimiter import AsyncLimiter
+import db
+from upstream import get_session
+from utils import percentile
+
+logger = logging.getLogger(__name__)
+
+class TargetHistory:
+    """Fixed-size window of probe results for one URL."""
+    __slots__ = ("url", "latencies", "statuses", "last_ping", "checks")
+
+    def __init__(self, url: str, size: int):
+        self.url = url
+        self.latencies: deque = deque(maxlen=size)  # ms, successful probes only
+        self.statuses: deque = deque(maxlen=size)   # "up" / "down" / "error"
+        self.last_ping: Optional[str] = None
+        self.checks = 0
+
+    def record(self, status: str, latency_ms: Optional[float]):
+        self.statuses.append(status)
+        if latency_ms is not None:
+            self.latencies.append(latency_ms)
+        self.last_ping = datetime.now(timezone.utc).isoformat()
+        self.checks += 1
+
+    def summary(self) -> dict:
+        latencies = list(self.latencies)
+        up = sum(1 for status in self.statuses if status == "up")
+        return {
+            "url": self.url,
+            "status": self.statuses[-1] if self.statuses else "unknown",
+            "last_ping": self.last_ping,
+            "checks": self.checks,
+            "window": len(self.statuses),
+            "availability": round(up / len(self.statuses) * 100, 2) if self.statuses else None,
+            "p50_ms": round(percentile(latencies, 0.50), 1) if latencies else None,
+            "p95_ms": round(percentile(latencies, 0.95), 1) if latencies else None,
+            "p99_ms": round(percentile(latencies, 0.99), 1) if latencies else None,
+        }
+
+class UptimeMonitor:
+    """Probes every target concurrently on the shared upstream session, with
+    per-target jitter, and persists summaries in one batch every
+    `persist_interval` seconds instead of one row per ping."""
+
+    def __init__(self, interval: float = 300, jitter: float = 10, history: int = 288, persist_interval: float = 900):
+        self.interval = interval
+        self.jitter = jitter
+        self.history = history
+        self.persist_interval = persist_interval
+        self.targets: Dict[str, TargetHistory] = {}
+        self.limiter = AsyncLimiter(10, 1)  # 10 requests per second
+        self.last_persist = time.monotonic()
+
+    def add(self, url: str):
+        self.targets.setdefault(url, TargetHistory(url, self.history))
+
+    def remove(self, url: str) -> bool:
+        return self.targets.pop(url, None) is not None
+
+    async def register(self, url: str):
+        self.add(url)
+        await db.execute("uptime_target_insert", url)
+
+    async def unregister(self, url: str) -> bool:
+        removed = self.remove(url)
+        async with db.acquire("uptime_target_delete") as conn:
+            await db.execute("uptime_target_delete", url, conn=conn)
+            await db.execute("uptime_config_delete", url, conn=conn)
+        return removed
+
+    def summaries(self) -> List[dict]:
+        return [target.summary() for target in self.targets.values()]
+
+    async def probe(self, target: TargetHistory):
+        await asyncio.sleep(random.uniform(0, self.jitter))
+        async with self.limiter:
+            session = await get_session()
+            started = time.monotonic()
+            try:
+                async with session.get(target.url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                    status = "up" if response.status == 200 else "down"
+                    target.record(status, (time.monotonic() - started) * 1000)
+            except Exception as e:
+                target.record("error", None)
+                logger.error(f"Uptime check failed for {target.url}: {e}")
+
+    async def probe_all(self):
+        await asyncio.gather(*(self.probe(target) for target in list(self.targets.values())))
+
+    async def load(self):
+        # uptime_config held the single URL used before multi-target checks
+        rows = await db.fetch("uptime_targets_all")
+        for row in rows:
+            self.add(row["url"])
+
+    async def persist(self):
+        summaries = [s for s in self.summaries() if s["checks"]]
+        self.last_persist = time.monotonic()
+        if not summaries:
+            return
+        await db.executemany("uptime_summary_upsert", [
+            (s["url"], s["last_ping"], s["status"], s["checks"], s["availability"], s["p50_ms"], s["p95_ms"])
+            for s in summaries
+        ])
+
+    async def run(self):
+        await self.load()
+        while True:
+            if self.targets:
+                await self.probe_all()
+                up = sum(1 for s in self.summaries() if s["status"] == "up")
+                logger.info(f"Uptime check: {up}/{len(self.targets)} targets up")
+            if time.monotonic() - self.last_persist >= self.persist_interval:
+                try:
+                    await self.persist()
+                except Exception as e:
+                    logger.error(f"Failed to persist uptime summaries: {e}")
+            await asyncio.sleep(self.interval)
+
+uptime_monitor = UptimeMonitor(
+    interval=float(os.getenv("UPTIME_INTERVAL", 300)),
+    jitter=float(os.getenv("UPTIME_JITTER", 10)),
+    history=int(os.getenv("UPTIME_HISTORY", 288)),
+    persist_interval=float(os.getenv("UPTIME_PERSIST_INTERVAL", 900)),
+)
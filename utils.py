@@ -1,28 +1,40 @@
 import re
+import html
+import math
 from datetime import datetime, timedelta, timezone
-import aiohttp
 from typing import Tuple, Optional
+from upstream import get_json
 
 async def calculate_hitrate(user_id: int) -> tuple[float, float, float, int, int, int, int]:
-    from db import get_db_connection
-    pool = await get_db_connection()
+    import db
+    from write_buffer import write_buffer
     one_month_ago = datetime.now(timezone.utc) - timedelta(days=30)
-    async with pool.acquire() as conn:
-        calls = await conn.fetch(
-            "SELECT * FROM user_calls WHERE user_id = $1 AND timestamp >= $2",
-            user_id, one_month_ago.isoformat()
-        )
-        total_calls = len(calls)
-        if total_calls == 0:
-            return 0.0, 0.0, 0.0, 0, 0, 0, 0
-        successful_5x = sum(1 for call in calls if call["peak_market_cap"] >= call["initial_market_cap"] * 5)
-        successful_2x = sum(1 for call in calls if call["peak_market_cap"] >= call["initial_market_cap"] * 2)
-        total_unbonded = sum(1 for call in calls if not call["bonded"])
-        migrated = sum(1 for call in calls if call["migrated"])
-        hitrate_5x = (successful_5x / total_calls) * 100 if total_calls > 0 else 0
-        hitrate_2x = (successful_2x / total_calls) * 100 if total_calls > 0 else 0
-        migration_rate = (migrated / total_unbonded) * 100 if total_unbonded > 0 else 0
-        return hitrate_5x, hitrate_2x, migration_rate, total_calls, successful_5x, total_unbonded, migrated
+    calls = await db.fetch("calls_since", user_id, one_month_ago.isoformat())
+    # Include calls still waiting in the write-behind buffer
+    stored = {call["address"] for call in calls}
+    calls = list(calls) + [call for call in write_buffer.pending_calls(user_id) if call["address"] not in stored]
+    total_calls = len(calls)
+    if total_calls == 0:
+        return 0.0, 0.0, 0.0, 0, 0, 0, 0
+    successful_5x = sum(1 for call in calls if call["peak_market_cap"] >= call["initial_market_cap"] * 5)
+    successful_2x = sum(1 for call in calls if call["peak_market_cap"] >= call["initial_market_cap"] * 2)
+    total_unbonded = sum(1 for call in calls if not call["bonded"])
+    migrated = sum(1 for call in calls if call["migrated"])
+    hitrate_5x = (successful_5x / total_calls) * 100 if total_calls > 0 else 0
+    hitrate_2x = (successful_2x / total_calls) * 100 if total_calls > 0 else 0
+    migration_rate = (migrated / total_unbonded) * 100 if total_unbonded > 0 else 0
+    return hitrate_5x, hitrate_2x, migration_rate, total_calls, successful_5x, total_unbonded, migrated
+
+def percentile(values, pct: float) -> Optional[float]:
+    """Nearest-rank percentile of `values` (pct in (0, 1]), None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(max(math.ceil(len(ordered) * pct) - 1, 0), len(ordered) - 1)]
+
+def escape_markdown(text: str) -> str:
+    """Escape Markdown special characters."""
+    return str(html.escape(text)).replace("_", "\\_").replace("*", "\\*").replace("`", "\\`")
 
 def format_value(value: float) -> str:
     return f"{value:,.0f}"
@@ -56,29 +68,47 @@ async def format_market_cap(mc: float) -> str:
     return f"${format_value(mc)}"
 
 async def fetch_market_cap(address: str, timestamp: datetime) -> Tuple[str, float, Optional[datetime], dict]:
-    async with aiohttp.ClientSession() as session:
-        url = f"https://api.dexscreener.com/latest/dex/tokens/{address}"
-        async with session.get(url) as response:
-            if response.status != 200:
-                return "N/A", 0.0, None, {}
-            data = await response.json()
-            if not data["pairs"]:
-                return "N/A", 0.0, None, {}
-            pair = data["pairs"][0]
-            market_cap = pair.get("fdv", 0.0)
-            created_at = pair.get("pairCreatedAt")
-            created_dt = datetime.fromtimestamp(created_at / 1000, tz=timestamp.tzinfo) if created_at else None
-            token_stats = {
-                "ticker": pair.get("baseToken", {}).get("symbol", "UNKNOWN"),
-                "name": pair.get("baseToken", {}).get("name", "Unknown Token"),
-                "liquidity": pair.get("liquidity", {}).get("usd", 0.0),
-                "volume_6h": pair.get("volume", {}).get("h6", 0.0),
-                "buys_5h": pair.get("txns", {}).get("h5", {}).get("buys", 0),
-                "sells_5h": pair.get("txns", {}).get("h5", {}).get("sells", 0),
-                "dex": pair.get("dexId", "Unknown DEX"),
-                "market_cap_6h_ago": market_cap * 0.9  # Simulated 6-hour ago value
-            }
-            return await format_market_cap(market_cap), market_cap, created_dt, token_stats
+    data = await get_json("dexscreener", f"/latest/dex/tokens/{address}")
+    if data is None:
+        return await fetch_market_cap_fallback(address)
+    if not data.get("pairs"):
+        return "N/A", 0.0, None, {}
+    pair = data["pairs"][0]
+    market_cap = pair.get("fdv", 0.0)
+    created_at = pair.get("pairCreatedAt")
+    created_dt = datetime.fromtimestamp(created_at / 1000, tz=timestamp.tzinfo) if created_at else None
+    token_stats = {
+        "ticker": pair.get("baseToken", {}).get("symbol", "UNKNOWN"),
+        "name": pair.get("baseToken", {}).get("name", "Unknown Token"),
+        "liquidity": pair.get("liquidity", {}).get("usd", 0.0),
+        "volume_6h": pair.get("volume", {}).get("h6", 0.0),
+        "buys_5h": pair.get("txns", {}).get("h5", {}).get("buys", 0),
+        "sells_5h": pair.get("txns", {}).get("h5", {}).get("sells", 0),
+        "dex": pair.get("dexId", "Unknown DEX"),
+        "market_cap": market_cap,
+        "market_cap_6h_ago": market_cap * 0.9  # Simulated 6-hour ago value
+    }
+    return await format_market_cap(market_cap), market_cap, created_dt, token_stats
+
+async def fetch_market_cap_fallback(address: str) -> Tuple[str, float, Optional[datetime], dict]:
+    """GeckoTerminal quote used while DexScreener is slow or its breaker is open."""
+    data = await get_json("geckoterminal", f"/api/v2/networks/solana/tokens/{address}")
+    if not data or not data.get("data"):
+        return "N/A", 0.0, None, {}
+    attributes = data["data"].get("attributes", {})
+    market_cap = float(attributes.get("fdv_usd") or attributes.get("market_cap_usd") or 0.0)
+    token_stats = {
+        "ticker": attributes.get("symbol", "UNKNOWN"),
+        "name": attributes.get("name", "Unknown Token"),
+        "liquidity": float(attributes.get("total_reserve_in_usd") or 0.0),
+        "volume_6h": float((attributes.get("volume_usd") or {}).get("h6") or 0.0),
+        "buys_5h": 0,
+        "sells_5h": 0,
+        "dex": "Unknown DEX",
+        "market_cap": market_cap,
+        "market_cap_6h_ago": market_cap * 0.9
+    }
+    return await format_market_cap(market_cap), market_cap, None, token_stats
 
 def format_liquidity(liquidity: float) -> str:
     if liquidity >= 1_000_000:
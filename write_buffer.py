@@ -0,0 +1,110 @@
+import os
+import asyncio
+import logging
+from typing import Dict, Set, Tuple, List
+import db
+
+logger = logging.getLogger(__name__)
+
+class WriteBuffer:
+    """Collects alert/call inserts and bonding updates and writes them in one
+    transaction per flush, either when `max_batch` writes are pending or every
+    `flush_interval` seconds. Rows stay readable through `has_alert` and
+    `pending_calls` until their flush commits."""
+
+    def __init__(self, max_batch: int = 500, flush_interval: float = 1.0):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.alerts: Dict[str, tuple] = {}
+        self.calls: Dict[Tuple[int, str], tuple] = {}
+        self.bonded: Set[str] = set()
+        # Rows taken by an in-progress flush; still part of the overlay.
+        self.flushing_alerts: Dict[str, tuple] = {}
+        self.flushing_calls: Dict[Tuple[int, str], tuple] = {}
+        self.wakeup = asyncio.Event()
+        self.lock = asyncio.Lock()
+        self.flushes = 0
+        self.rows_written = 0
+
+    def __len__(self) -> int:
+        return len(self.alerts) + len(self.calls) + len(self.bonded)
+
+    def _added(self):
+        if len(self) >= self.max_batch:
+            self.wakeup.set()
+
+    def add_alert(self, address: str, message_id: int, initial_market_cap: float, chat_id: int, bot_name: str, timestamp: str, bonded: bool):
+        if not self.has_alert(address):
+            self.alerts[address] = (address, message_id, initial_market_cap, chat_id, bot_name, timestamp, bonded)
+            self._added()
+
+    def add_call(self, user_id: int, address: str, initial_market_cap: float, timestamp: str, bonded: bool):
+        key = (user_id, address)
+        if key not in self.calls and key not in self.flushing_calls:
+            self.calls[key] = (user_id, address, initial_market_cap, timestamp, bonded)
+            self._added()
+
+    def mark_bonded(self, address: str):
+        alert = self.alerts.get(address)
+        if alert is not None:
+            self.alerts[address] = alert[:6] + (True,)
+            return
+        self.bonded.add(address)
+        self._added()
+
+    def has_alert(self, address: str) -> bool:
+        return address in self.alerts or address in self.flushing_alerts
+
+    def pending_calls(self, user_id: int) -> List[dict]:
+        # Snapshot both maps: callers on other threads (the API) read while the
+        # bot loop inserts and flush() swaps them
+        rows = []
+        for calls in (self.flushing_calls, self.calls):
+            for (call_user, _), (_, address, initial_mc, timestamp, bonded) in list(calls.items()):
+                if call_user == user_id:
+                    rows.append({
+                        "address": address, "initial_market_cap": initial_mc, "timestamp": timestamp,
+                        "bonded": bonded, "peak_market_cap": 0.0, "migrated": False
+                    })
+        return rows
+
+    async def flush(self):
+        async with self.lock:
+            if not len(self):
+                return
+            self.flushing_alerts, self.alerts = self.alerts, {}
+            self.flushing_calls, self.calls = self.calls, {}
+            bonded, self.bonded = self.bonded, set()
+            try:
+                async with db.acquire("alert_insert") as conn:
+                    async with conn.transaction():
+                        if self.flushing_alerts:
+                            await db.executemany("alert_insert", list(self.flushing_alerts.values()), conn=conn)
+                        if self.flushing_calls:
+                            await db.executemany("call_insert", list(self.flushing_calls.values()), conn=conn)
+                        if bonded:
+                            await db.execute("alerts_mark_bonded", list(bonded), conn=conn)
+                self.flushes += 1
+                self.rows_written += len(self.flushing_alerts) + len(self.flushing_calls) + len(bonded)
+            except Exception as e:
+                logger.error(f"Write buffer flush failed, keeping rows for retry: {e}")
+                self.alerts = {**self.flushing_alerts, **self.alerts}
+                self.calls = {**self.flushing_calls, **self.calls}
+                self.bonded |= bonded
+            finally:
+                self.flushing_alerts = {}
+                self.flushing_calls = {}
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self.flush()
+
+write_buffer = WriteBuffer(
+    max_batch=int(os.getenv("WRITE_BUFFER_MAX_BATCH", 500)),
+    flush_interval=float(os.getenv("WRITE_BUFFER_FLUSH_INTERVAL", 1.0)),
+)